@@ -1,14 +1,53 @@
+import atexit
+import base64
+import bisect
+import collections
+import contextlib
+import csv
 import datetime
-from flask import Flask, current_app, flash, redirect, render_template, request, session, url_for, jsonify
+import decimal
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import math
+import platform
+import subprocess
+import zlib
+import click
+from flask import (Flask, Response, abort, before_render_template, current_app, flash, g, has_request_context, make_response, redirect,
+                   render_template, request, session, stream_template, stream_with_context, template_rendered, url_for, jsonify)
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, current_user
 from flask_migrate import Migrate
+from markupsafe import Markup
 import os
-from sqlalchemy import desc
+import random
+import re
+import sqlite3
+import threading
+import time
+from sqlalchemy import and_, delete, desc, event, func, insert, literal, or_, select, text, union_all, update
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import aliased
-from werkzeug.security import check_password_hash
+from sqlalchemy.pool import QueuePool
+from werkzeug.security import check_password_hash, generate_password_hash
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # optional, the json module writes the same output more slowly
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, without it responses are only gzipped
+    brotli = None
+
 load_dotenv()
 
 
@@ -20,18 +59,177 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(Agents, user_id)
-
-
 # Configure the database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://' + os.environ.get('DB_USER') + ':' + os.environ.get(
-    'DB_PASSWORD') + '@' + os.environ.get('DB_HOST') + ':' + os.environ.get('DB_PORT') + '/' + os.environ.get('DB_NAME')
+# DATABASE_URL points the app at another database, e.g. sqlite:///local.db for local checks
+if os.environ.get('DATABASE_URL'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+else:
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://' + os.environ.get('DB_USER') + ':' + os.environ.get(
+        'DB_PASSWORD') + '@' + os.environ.get('DB_HOST') + ':' + os.environ.get('DB_PORT') + '/' + os.environ.get('DB_NAME')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Connection pool, sized per worker process
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+# Seconds a request waits for a free connection before failing
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+# Reconnect before MySQL's wait_timeout drops an idle connection under us
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+app.config['DB_CONNECT_TIMEOUT'] = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+
+
+class PoolStats:
+    """Counters about how long checkouts wait for a pooled connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.invalidated = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_invalidated(self):
+        with self._lock:
+            self.invalidated += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'wait_seconds_total': round(self.wait_seconds, 6),
+                'wait_seconds_max': round(self.max_wait_seconds, 6),
+                'timeouts': self.timeouts,
+                'invalidated': self.invalidated,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records in ``pool_stats`` how long each checkout waited.
+
+    The time includes opening a new connection when the pool has to, which is
+    part of what a request waits for too.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record_timeout()
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - started)
+
+
+def engine_options(uri):
+    options = {
+        'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+    }
+    # SQLite is only used for local checks and keeps the pool Flask-SQLAlchemy picks for it
+    if not uri.startswith('sqlite'):
+        options.update({
+            'poolclass': TimedQueuePool,
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+            'connect_args': {'connect_timeout': app.config['DB_CONNECT_TIMEOUT']},
+        })
+    return options
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# How long a worker trusts its copy of the status tables and how long browsers may reuse them
+app.config['LOOKUP_CACHE_TTL'] = int(os.environ.get('LOOKUP_CACHE_TTL', 300))
+app.config['LOOKUP_CACHE_MAX_AGE'] = int(os.environ.get('LOOKUP_CACHE_MAX_AGE', 300))
+# Responses smaller than this go out uncompressed, the encoding headers would eat most of the saving
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+# Rental StatusIDs that hold a unit over the rental's dates, comma separated. Only Active (1)
+# by default, add e.g. an "On hold" status's id if the rental_statuses table has one
+app.config['OPEN_RENTAL_STATUS_IDS'] = [int(status_id) for status_id in os.environ.get('OPEN_RENTAL_STATUS_IDS', '1').split(',')]
+# Equipment claims skip rows another transaction has locked, which MySQL 8 / MariaDB 10.6+ can do;
+# turn this off for older servers
+app.config['RESERVATION_SKIP_LOCKED'] = os.environ.get('RESERVATION_SKIP_LOCKED', '1') == '1'
+# How long a worker trusts who a signed-in agent is before reading the agents table again,
+# which is also the longest another worker's status or password change can go unnoticed
+app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+# Password checks one worker runs at once, and how long a login waits for a turn before a 503
+app.config['LOGIN_HASH_CONCURRENCY'] = int(os.environ.get('LOGIN_HASH_CONCURRENCY', 2))
+app.config['LOGIN_HASH_WAIT_SECONDS'] = float(os.environ.get('LOGIN_HASH_WAIT_SECONDS', 5))
+# Seconds a successful login lets the same name and password skip the hash check, 0 turns it off
+app.config['LOGIN_CACHE_SECONDS'] = int(os.environ.get('LOGIN_CACHE_SECONDS', 0))
+# Requests slower than this are logged with the SQL they ran, 0 turns the log off
+app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 0))
+# /metrics answers signed-in agents and scrapers sending this as a bearer token, and
+# anyone at all only with METRICS_PUBLIC=1 (e.g. when it's only reachable from inside)
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['METRICS_PUBLIC'] = os.environ.get('METRICS_PUBLIC', '0') == '1'
+# Rendered first pages of the /display and /modals tables: 'sqlite' (a file every worker on
+# the host shares, so they see each other's writes), 'memory' (only safe with a single worker)
+# or 'off'. Workers spread over several hosts share no file, turn it off there.
+app.config['FRAGMENT_CACHE'] = os.environ.get('FRAGMENT_CACHE', 'sqlite')
+app.config['FRAGMENT_CACHE_PATH'] = os.environ.get('FRAGMENT_CACHE_PATH', os.path.join(app.instance_path, 'fragments.sqlite3'))
+app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# Catches writes the app didn't make itself (another service, a SQL console)
+app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+# /events pushes changes committed by this worker. With several workers each page also
+# polls the shared table versions this often to catch the other workers' writes, 0 never.
+app.config['EVENTS_POLL_SECONDS'] = int(os.environ.get('EVENTS_POLL_SECONDS', 5 if app.config['FRAGMENT_CACHE'] == 'sqlite' else 0))
+# An /events stream ends after this long and the browser reconnects, freeing the thread meanwhile
+app.config['EVENTS_STREAM_SECONDS'] = int(os.environ.get('EVENTS_STREAM_SECONDS', 300))
+# Each open /events stream keeps a request thread busy the whole time, so only raise this
+# under an async worker (gunicorn -k gevent). Past this many streams in one process, and
+# by default, pages poll /events/versions every EVENTS_FALLBACK_POLL_SECONDS instead.
+app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 0))
+app.config['EVENTS_FALLBACK_POLL_SECONDS'] = int(os.environ.get('EVENTS_FALLBACK_POLL_SECONDS', 10))
+# Days ahead of a license/insurance expiry or a return date that the alerts start
+app.config['ALERT_TDL_DAYS'] = int(os.environ.get('ALERT_TDL_DAYS', 30))
+app.config['ALERT_INSURANCE_DAYS'] = int(os.environ.get('ALERT_INSURANCE_DAYS', 30))
+app.config['ALERT_RETURN_DAYS'] = int(os.environ.get('ALERT_RETURN_DAYS', 1))
+# Rescan in the background this often, 0 leaves it to `flask scan-alerts` (e.g. from cron)
+app.config['ALERT_SCAN_INTERVAL_SECONDS'] = int(os.environ.get('ALERT_SCAN_INTERVAL_SECONDS', 0))
+# Change log entries are written in batches of up to AUDIT_FLUSH_SIZE, at least every
+# AUDIT_FLUSH_SECONDS; past AUDIT_BUFFER_MAX unwritten entries (database down) the oldest are dropped
+app.config['AUDIT_FLUSH_SIZE'] = int(os.environ.get('AUDIT_FLUSH_SIZE', 200))
+app.config['AUDIT_FLUSH_SECONDS'] = float(os.environ.get('AUDIT_FLUSH_SECONDS', 2))
+app.config['AUDIT_BUFFER_MAX'] = int(os.environ.get('AUDIT_BUFFER_MAX', 100000))
+# Read the edited columns before each row edit so the change log has their old values, at the
+# cost of a SELECT per edit; off, edits are logged with their new values only
+app.config['AUDIT_OLD_VALUES'] = os.environ.get('AUDIT_OLD_VALUES', '0') == '1'
+# Jobs (?async=1, POST /jobs) are run by a dedicated `flask run-jobs` process. A single-process
+# deployment can instead have its web process start this many worker threads; with several
+# web workers leave it at 0, each would start its own set of pollers
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 0))
+app.config['JOB_POLL_SECONDS'] = float(os.environ.get('JOB_POLL_SECONDS', 2))
+# A worker touches the job it is running this often; a running job nobody has touched for
+# JOB_TIMEOUT_SECONDS is taken to have died with its worker and is run again, or failed
+# when that was its last attempt
+app.config['JOB_HEARTBEAT_SECONDS'] = int(os.environ.get('JOB_HEARTBEAT_SECONDS', 15))
+app.config['JOB_TIMEOUT_SECONDS'] = int(os.environ.get('JOB_TIMEOUT_SECONDS', 120))
+# Delay before the first retry of a failed job, doubled for every further attempt
+app.config['JOB_RETRY_SECONDS'] = int(os.environ.get('JOB_RETRY_SECONDS', 5))
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
+with app.app_context():
+    # Connections thrown away because pre-ping found them dead or a query failed on them
+    event.listen(db.engine, 'invalidate', lambda dbapi_connection, connection_record, exception: pool_stats.record_invalidated())
+
 
 class Company(db.Model):
     CompanyID = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -71,7 +269,7 @@ class VehicleStatuses(db.Model):
 
 class Agents(UserMixin, db.Model):
     AgentID = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    AgentName = db.Column(db.String(255))
+    AgentName = db.Column(db.String(255), index=True)
     AgentPassword = db.Column(db.String(255))
     StatusID = db.Column(db.Integer, db.ForeignKey('agent_statuses.StatusID'))
     updated_rentals = db.relationship('Rentals', primaryjoin="Agents.AgentID==Rentals.UpdatedByAgentID", backref='updated_by_agent', lazy=True)
@@ -98,11 +296,11 @@ class Agents(UserMixin, db.Model):
 
 class Customers(db.Model):
     CustomerID = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    FirstName = db.Column(db.String(255))
-    LastName = db.Column(db.String(255))
-    Phone = db.Column(db.String(15))
-    AltPhone = db.Column(db.String(15))
-    Email = db.Column(db.String(255))
+    FirstName = db.Column(db.String(255), index=True)
+    LastName = db.Column(db.String(255), index=True)
+    Phone = db.Column(db.String(15), index=True)
+    AltPhone = db.Column(db.String(15), index=True)
+    Email = db.Column(db.String(255), index=True)
     Address = db.Column(db.String(255))
     City = db.Column(db.String(255))
     State = db.Column(db.String(255))
@@ -119,6 +317,16 @@ class Customers(db.Model):
     vehicles = db.relationship('Vehicles', backref='customer', lazy=True)
     CompanyID = db.Column(db.Integer, db.ForeignKey('company.CompanyID'))
 
+    __table_args__ = (
+        # /display and the status filters select customers by status, newest first
+        db.Index('ix_customers_StatusID_CustomerID', 'StatusID', 'CustomerID'),
+        # The expiry scanner reads active customers by date range
+        db.Index('ix_customers_StatusID_TDLExpirationDate', 'StatusID', 'TDLExpirationDate'),
+        db.Index('ix_customers_StatusID_InsuranceExpDate', 'StatusID', 'InsuranceExpDate'),
+        # /search/notes on MySQL, SQLite keeps the note_search table instead
+        db.Index('ft_customers_notes', 'CustomerNote', 'LeaseAgreement', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
 
 class Equipment(db.Model):
     EquipmentID = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -129,6 +337,13 @@ class Equipment(db.Model):
     UpdatedByAgentID = db.Column(db.Integer, db.ForeignKey('agents.AgentID'))
     rentals = db.relationship('Rentals', backref='equipment', lazy=True)
 
+    __table_args__ = (
+        # claim_equipment() and the equipment type search, the trailing id lets a claim read the index only
+        db.Index('ix_equipment_EquipmentType_StatusID', 'EquipmentType', 'StatusID', 'EquipmentID'),
+        # /availableEquipment lists every available unit regardless of type
+        db.Index('ix_equipment_StatusID_EquipmentType', 'StatusID', 'EquipmentType'),
+    )
+
 
 class Rentals(db.Model):
     RentalID = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -141,6 +356,19 @@ class Rentals(db.Model):
     StatusID = db.Column(db.Integer, db.ForeignKey('rental_statuses.StatusID'))
     UpdatedByAgentID = db.Column(db.Integer, db.ForeignKey('agents.AgentID'))
 
+    __table_args__ = (
+        # A customer's rentals (printed page, change_status) and the customer join on /display
+        db.Index('ix_rentals_CustomerID_StatusID', 'CustomerID', 'StatusID'),
+        # Active or completed rentals, e.g. the past rentals table on /modals
+        db.Index('ix_rentals_StatusID_CustomerID', 'StatusID', 'CustomerID'),
+        db.Index('ix_rentals_EquipmentID', 'EquipmentID'),
+        # Active rentals due back by a date, for the overdue scanner
+        db.Index('ix_rentals_StatusID_ReturnDate', 'StatusID', 'ReturnDate'),
+        # The day's paperwork, see printed_batch()
+        db.Index('ix_rentals_RentalDate', 'RentalDate'),
+        db.Index('ft_rentals_notes', 'InternalNote', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
 
 class Vehicles(db.Model):
     VehicleID = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -154,6 +382,546 @@ class Vehicles(db.Model):
         'vehicle_statuses.StatusID'))
     UpdatedByAgentID = db.Column(db.Integer, db.ForeignKey('agents.AgentID'))
 
+    __table_args__ = (
+        db.Index('ix_vehicles_CustomerID', 'CustomerID'),
+    )
+
+
+class ExpiryAlerts(db.Model):
+    # Rewritten whole by scan_expiry_alerts(), one row per expiring or overdue thing
+    AlertID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    AlertType = db.Column(db.String(20), nullable=False)  # tdl, insurance or return
+    AlertState = db.Column(db.String(20), nullable=False)  # expiring/expired, due/overdue
+    CustomerID = db.Column(db.Integer, db.ForeignKey('customers.CustomerID'), nullable=False)
+    RentalID = db.Column(db.Integer, db.ForeignKey('rentals.RentalID'))
+    DueDate = db.Column(db.Date, nullable=False)
+    ScannedAt = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_expiry_alerts_DueDate', 'DueDate'),
+    )
+
+
+class Jobs(db.Model):
+    # Work queued by submit_job() and run by the job workers, see JOBS
+    JobID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    Kind = db.Column(db.String(50), nullable=False)
+    Payload = db.Column(db.Text, nullable=False)  # JSON
+    Status = db.Column(db.String(20), nullable=False)  # queued, running, succeeded, failed or cancelled
+    Attempts = db.Column(db.Integer, nullable=False, default=0)
+    MaxAttempts = db.Column(db.Integer, nullable=False)
+    CancelRequested = db.Column(db.Boolean, nullable=False, default=False)
+    Result = db.Column(db.Text(16 * 1024 * 1024))
+    ResultMimetype = db.Column(db.String(100))
+    Error = db.Column(db.Text)
+    SubmittedByAgentID = db.Column(db.Integer, db.ForeignKey('agents.AgentID'))
+    LockedBy = db.Column(db.String(100))
+    CreatedAt = db.Column(db.DateTime, nullable=False)  # UTC, like every Jobs timestamp
+    RunAfter = db.Column(db.DateTime, nullable=False)
+    StartedAt = db.Column(db.DateTime)
+    HeartbeatAt = db.Column(db.DateTime)  # last sign of life from the worker running it
+    FinishedAt = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # The workers pick the oldest runnable job and count what is running per kind
+        db.Index('ix_jobs_Status_RunAfter', 'Status', 'RunAfter'),
+        db.Index('ix_jobs_Status_Kind', 'Status', 'Kind'),
+    )
+
+
+class ChangeLog(db.Model):
+    # Append-only history of agents' changes, written behind the requests by AuditLog
+    ChangeID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    EntityType = db.Column(db.String(20), nullable=False)  # customers, equipment, rentals or vehicles
+    EntityID = db.Column(db.Integer, nullable=False)
+    Action = db.Column(db.String(20), nullable=False)  # create, update or change_status
+    Field = db.Column(db.String(50))  # None for a create, whose NewValue holds every column as JSON
+    OldValue = db.Column(db.Text)
+    NewValue = db.Column(db.Text)
+    AgentID = db.Column(db.Integer, db.ForeignKey('agents.AgentID'))
+    ChangedAt = db.Column(db.DateTime, nullable=False)  # UTC
+
+    __table_args__ = (
+        # /audit/<entity>/<id>, newest first
+        db.Index('ix_change_log_EntityType_EntityID_ChangeID', 'EntityType', 'EntityID', 'ChangeID'),
+    )
+
+
+# Callbacks run after a commit with the set of table names it wrote to
+table_change_listeners = []
+# Callbacks run after a commit with ``{table: ids}``, ids is None when the rows aren't known
+row_change_listeners = []
+
+
+def on_tables_changed(listener):
+    """Register ``listener(tables)`` to be called after every commit that changed ``tables``."""
+    table_change_listeners.append(listener)
+    return listener
+
+
+def on_rows_changed(listener):
+    """Register ``listener(rows)`` to be called after every commit with the rows it wrote.
+
+    ``rows`` maps each changed table to the primary keys written, or to None when
+    a statement changed rows it didn't name. Give update()/delete() statements
+    ``.execution_options(changed_ids=ids)`` to name them.
+    """
+    row_change_listeners.append(listener)
+    return listener
+
+
+# Bookkeeping no page shows, writing it must not broadcast on /events or bump fragment versions
+UNTRACKED_TABLES = {Jobs.__table__.name}
+
+
+def mark_tables_changed(session, *tables):
+    session.info.setdefault('changed_tables', set()).update(table for table in tables if table not in UNTRACKED_TABLES)
+
+
+def note_changed_rows(session, table, ids):
+    if table in UNTRACKED_TABLES:
+        return
+    rows = session.info.setdefault('changed_rows', {})
+    if ids is None:
+        rows[table] = None
+    elif rows.get(table, ()) is not None:
+        rows.setdefault(table, set()).update(ids)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_flushed_tables(session, flush_context):
+    # new/dirty/deleted still describe what this flush just wrote
+    for obj in session.new | session.dirty | session.deleted:
+        table = obj.__table__.name
+        mark_tables_changed(session, table)
+        note_changed_rows(session, table, [obj.__mapper__.primary_key_from_instance(obj)[0]])
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_executed_tables(orm_execute_state):
+    # Catches update(Model)/insert(Model)/delete(Model) run through db.session.execute()
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            table = mapper.local_table.name
+            mark_tables_changed(orm_execute_state.session, table)
+            note_changed_rows(orm_execute_state.session, table, orm_execute_state.execution_options.get('changed_ids'))
+
+
+@event.listens_for(db.session, 'after_commit')
+def notify_table_changes(session):
+    tables = session.info.pop('changed_tables', None)
+    rows = session.info.pop('changed_rows', {})
+    if not tables:
+        return
+    for listener in table_change_listeners:
+        try:
+            listener(tables)
+        except Exception:
+            app.logger.exception('Table change listener %r failed', listener)
+    rows = {table: rows.get(table) for table in tables}
+    for listener in row_change_listeners:
+        try:
+            listener(rows)
+        except Exception:
+            app.logger.exception('Row change listener %r failed', listener)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_table_changes(session):
+    session.info.pop('changed_tables', None)
+    session.info.pop('changed_rows', None)
+
+##############################################################################################################################################################################################################################
+#                                                                            CHANGE TRACKING                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+class MemoryFragmentStore:
+    """LRU of rendered fragments and table versions inside this process."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> (value, stored_at)
+        self._bytes = 0
+        self._versions = collections.Counter()
+        # Versions restart at 0 with the process, the epoch tells the two runs apart
+        self.epoch = random.getrandbits(62)
+
+    def get(self, key, max_age):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > max_age:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.time())
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def versions(self, tables):
+        with self._lock:
+            return [self._versions[table] for table in tables]
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class SqliteFragmentStore:
+    """The same LRU in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS fragments '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS fragments_used_at ON fragments (used_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            # Versions restart at 0 with a new file, the epoch tells the two files apart
+            connection.execute("INSERT OR IGNORE INTO versions (name, version) VALUES ('~epoch', ?)", (random.getrandbits(62),))
+            self.epoch = connection.execute("SELECT version FROM versions WHERE name = '~epoch'").fetchone()[0]
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key, max_age):
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute('SELECT value FROM fragments WHERE key = ? AND stored_at >= ?', (key, now - max_age)).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE fragments SET used_at = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        connection = self._connect()
+        now = time.time()
+        connection.execute('INSERT OR REPLACE INTO fragments (key, value, size, stored_at, used_at) VALUES (?, ?, ?, ?, ?)',
+                           (key, value, len(value), now, now))
+        # Drop the least recently used fragments past the size limit
+        connection.execute(
+            'DELETE FROM fragments WHERE key IN (SELECT key FROM '
+            '(SELECT key, SUM(size) OVER (ORDER BY used_at DESC, key) AS running FROM fragments) WHERE running > ?)',
+            (self.max_bytes,))
+
+    def versions(self, tables):
+        rows = dict(self._connect().execute(
+            f'SELECT name, version FROM versions WHERE name IN ({", ".join("?" * len(tables))})', list(tables)).fetchall())
+        return [rows.get(table, 0) for table in tables]
+
+    def bump(self, tables):
+        self._connect().executemany('INSERT INTO versions (name, version) VALUES (?, 1) '
+                                    'ON CONFLICT (name) DO UPDATE SET version = version + 1', [(table,) for table in tables])
+
+    def clear(self):
+        self._connect().execute('DELETE FROM fragments')
+
+
+class FragmentCache:
+    """Rendered fragments keyed by the version of every table they were rendered from.
+
+    Each commit bumps the versions of the tables it wrote (see ``bump_fragment_versions``),
+    so the next lookup builds a new key and the stale fragment ages out of the LRU.
+    """
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def get_or_render(self, name, tables, render):
+        """Return the cached ``render()`` result for ``name``, rendering it on a miss.
+
+        ``render`` returns something JSON can store. The versions are read before it
+        runs, so a write that lands meanwhile always leads to a fresh key.
+        """
+        if self.store is None:
+            return render()
+        tables = sorted(tables)
+        versions = self.store.versions(tables)
+        key = name + ':' + ','.join(f'{table}={version}' for table, version in zip(tables, versions))
+        cached = self.store.get(key, self.ttl)
+        if cached is not None:
+            return json.loads(cached)
+        value = render()
+        self.store.set(key, json.dumps(value))
+        return value
+
+    def bump(self, tables):
+        if self.store is not None:
+            self.store.bump(sorted(tables))
+
+    def version_tag(self, tables):
+        """A string that changes whenever one of ``tables`` does, None with the cache off."""
+        if self.store is None:
+            return None
+        tables = sorted(tables)
+        versions = self.store.versions(tables)
+        return f'{self.store.epoch}:' + ','.join(f'{table}={version}' for table, version in zip(tables, versions))
+
+
+def fragment_store(kind):
+    if kind == 'memory':
+        return MemoryFragmentStore(app.config['FRAGMENT_CACHE_MAX_BYTES'])
+    if kind == 'sqlite':
+        return SqliteFragmentStore(app.config['FRAGMENT_CACHE_PATH'], app.config['FRAGMENT_CACHE_MAX_BYTES'])
+    if kind == 'off':
+        return None
+    raise ValueError(f'FRAGMENT_CACHE must be memory, sqlite or off, not {kind!r}')
+
+
+fragment_cache = FragmentCache(fragment_store(app.config['FRAGMENT_CACHE']), app.config['FRAGMENT_CACHE_TTL'])
+
+
+@on_tables_changed
+def bump_fragment_versions(tables):
+    fragment_cache.bump(tables)
+
+
+def cached_rows_fragment(name, tables, template, load):
+    """Return ``(html, next_cursor)`` for a table's first page, from the fragment cache when possible."""
+    def render():
+        rows, next_cursor = load()
+        return {'html': render_template(template, rows=rows), 'next_cursor': next_cursor}
+
+    fragment = fragment_cache.get_or_render(name, tables, render)
+    return Markup(fragment['html']), fragment['next_cursor']
+
+
+def build_tag():
+    """Hash of app.py and the templates, so a deploy changes every page ETag."""
+    digest = hashlib.sha1()
+    paths = [os.path.join(app.root_path, 'app.py')]
+    for folder, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        paths.extend(os.path.join(folder, name) for name in files)
+    for path in sorted(paths):
+        with open(path, 'rb') as handle:
+            digest.update(handle.read())
+    return digest.hexdigest()[:16]
+
+
+BUILD_TAG = build_tag()
+
+
+def version_etag(name, tables):
+    """ETag for a response built only from ``tables``, None when the versions aren't tracked.
+
+    It changes with the table versions, the signed in agent, a deploy, and every
+    FRAGMENT_CACHE_TTL seconds to pick up writes made outside the app.
+    """
+    tag = fragment_cache.version_tag(tables)
+    if tag is None:
+        return None
+    period = int(time.time() // fragment_cache.ttl) if fragment_cache.ttl else 0
+    agent = current_user.get_id() if current_user.is_authenticated else ''
+    return hashlib.sha1(f'{BUILD_TAG}|{name}|{agent}|{period}|{tag}'.encode()).hexdigest()
+
+
+def conditional_response(name, tables, build):
+    """Answer If-None-Match with a 304 when ``tables`` haven't changed, otherwise return ``build()``.
+
+    The 304 is decided before ``build`` runs, so an unchanged page costs no query
+    and no rendering.
+    """
+    etag = version_etag(name, tables)
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    if etag is not None:
+        response.set_etag(etag)
+    # The browser keeps the page but asks every time whether it's still current
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+##############################################################################################################################################################################################################################
+#                                                                            FRAGMENT CACHE                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+def password_key(password_hash):
+    """A short fingerprint of an agent's password hash, changes when the password does."""
+    return hmac.new(app.secret_key.encode(), (password_hash or '').encode(), hashlib.sha256).hexdigest()[:16]
+
+
+class AgentIdentity(UserMixin):
+    """What a request needs to know about the signed-in agent, without the ORM row."""
+
+    def __init__(self, agent_id, agent_name, status_id, status_name, password_key):
+        self.AgentID = agent_id
+        self.AgentName = agent_name
+        self.StatusID = status_id
+        self.StatusName = status_name
+        self.password_key = password_key
+
+    def get_id(self):
+        return str(self.AgentID)
+
+    @property
+    def is_active(self):
+        # Same rule as Agents.is_active
+        return self.StatusID == 1
+
+
+class IdentityCache:
+    """Per-process AgentIdentity by AgentID.
+
+    An entry lives ``ttl`` seconds, or until a commit in this process writes to
+    the agent or to the agent statuses (see ``invalidate_identities``).
+    """
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, agent_id):
+        """Return the agent's identity, None if there is no such agent."""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._entries.move_to_end(agent_id)
+                return entry[0]
+
+        row = db.session.execute(
+            select(Agents.AgentID, Agents.AgentName, Agents.StatusID, Agents.AgentPassword, AgentStatuses.StatusName)
+            .outerjoin(AgentStatuses, AgentStatuses.StatusID == Agents.StatusID)
+            .where(Agents.AgentID == agent_id)
+        ).first()
+        if row is None:
+            return None
+        return self.put(AgentIdentity(row.AgentID, row.AgentName, row.StatusID, row.StatusName, password_key(row.AgentPassword)))
+
+    def put(self, identity):
+        with self._lock:
+            self._entries[identity.AgentID] = (identity, time.monotonic())
+            self._entries.move_to_end(identity.AgentID)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, agent_ids=None):
+        """Forget ``agent_ids``, or everyone when None."""
+        with self._lock:
+            if agent_ids is None:
+                self._entries.clear()
+            else:
+                for agent_id in agent_ids:
+                    self._entries.pop(agent_id, None)
+
+
+identity_cache = IdentityCache(app.config['IDENTITY_CACHE_TTL'])
+
+
+@on_rows_changed
+def invalidate_identities(rows):
+    if AgentStatuses.__table__.name in rows:
+        identity_cache.invalidate()
+    elif Agents.__table__.name in rows:
+        identity_cache.invalidate(rows[Agents.__table__.name])
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    try:
+        identity = identity_cache.get(int(user_id))
+    except ValueError:
+        return None
+    # Deactivated agents and sessions from before a password change are signed out
+    if identity is None or not identity.is_active:
+        return None
+    if session.get('password_key', identity.password_key) != identity.password_key:
+        return None
+    return identity
+
+
+class LoginBusy(Exception):
+    pass
+
+
+class LoginCheck:
+    """check_password_hash() with a cap on how many run at once.
+
+    Each check is deliberately slow, a shift's worth of agents signing in together
+    would otherwise take every core. With ``remember_seconds`` a name and password
+    that just passed skip the hash; the entry is keyed by an HMAC that includes
+    the stored hash, so it never holds the password and dies with a password change.
+    """
+
+    def __init__(self, concurrency, wait_seconds, remember_seconds, max_entries=1024):
+        self.wait_seconds = wait_seconds
+        self.remember_seconds = remember_seconds
+        self.max_entries = max_entries
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._passed = collections.OrderedDict()
+
+    def _key(self, agent_id, password_hash, password):
+        message = f'{agent_id}\0{password_hash}\0{password}'.encode()
+        return hmac.new(app.secret_key.encode(), message, hashlib.sha256).digest()
+
+    def check(self, agent_id, password_hash, password):
+        """True if ``password`` matches, raising LoginBusy when no check slot frees up in time."""
+        if not password_hash or password is None:
+            return False
+        key = self._key(agent_id, password_hash, password) if self.remember_seconds else None
+        if key is not None:
+            with self._lock:
+                passed_at = self._passed.get(key)
+                if passed_at is not None and time.monotonic() - passed_at <= self.remember_seconds:
+                    return True
+
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise LoginBusy()
+        try:
+            matches = check_password_hash(password_hash, password)
+        finally:
+            self._slots.release()
+
+        if matches and key is not None:
+            with self._lock:
+                self._passed[key] = time.monotonic()
+                while len(self._passed) > self.max_entries:
+                    self._passed.popitem(last=False)
+        return matches
+
+
+login_check = LoginCheck(app.config['LOGIN_HASH_CONCURRENCY'], app.config['LOGIN_HASH_WAIT_SECONDS'],
+                         app.config['LOGIN_CACHE_SECONDS'])
+
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -165,9 +933,22 @@ def login():
         agent = Agents.query.filter_by(AgentName=username).first()
 
         # If the agent exists and the password matches, log them in
-        if agent and check_password_hash(agent.AgentPassword, password):
+        try:
+            password_matches = agent is not None and login_check.check(agent.AgentID, agent.AgentPassword, password)
+        except LoginBusy:
+            flash('Too many sign-ins at once, please try again.')
+            response = make_response(render_template('index.html'), 503)
+            response.headers['Retry-After'] = '5'
+            return response
+
+        if password_matches:
             login_user(agent)
             session['username'] = username  # update session
+            session['password_key'] = password_key(agent.AgentPassword)
+            # The row is already here, the next request needn't read it again
+            status_names = dict(lookup_cache.get()[0]['agent']['rows'])
+            identity_cache.put(AgentIdentity(agent.AgentID, agent.AgentName, agent.StatusID,
+                                             status_names.get(agent.StatusID), session['password_key']))
             flash('Logged in successfully.')
             return redirect(url_for('modals'))
 
@@ -190,13 +971,38 @@ def index():
 ##############################################################################################################################################################################################################################
 
 
-@app.route('/display', methods=['GET'])
-def display_data():
-    if not current_user.is_authenticated:
-        return redirect(url_for('login'))
+# The tables display_query() reads and the ids its rows can be looked up by
+DISPLAY_TABLES = ('customers', 'rentals', 'equipment')
+DISPLAY_ROW_KEYS = {'RentalID': Rentals.RentalID, 'CustomerID': Customers.CustomerID, 'EquipmentID': Rentals.EquipmentID}
+# Most ids one ?ids= lookup may name
+MAX_ROW_IDS = 200
+
 
-    query = db.session.query(
+def filter_row_ids(query, row_keys, args):
+    """Narrow ``query`` to the rows ``args`` names with ``match`` and ``ids``.
+
+    Returns ``(query, narrowed)``, the page uses it to refresh rows that changed.
+    """
+    ids = args.get('ids')
+    if not ids:
+        return query, False
+    match = args.get('match')
+    if match not in row_keys:
+        raise ValueError('Cannot match on ' + str(match))
+    try:
+        ids = [int(value) for value in ids.split(',')]
+    except ValueError:
+        raise ValueError('ids must be comma separated integers')
+    if len(ids) > MAX_ROW_IDS:
+        raise ValueError(f'At most {MAX_ROW_IDS} ids at a time')
+    return query.filter(row_keys[match].in_(ids)), True
+
+
+def display_query():
+    return db.session.query(
         Customers.CustomerID,
+        Rentals.RentalID,
+        Rentals.EquipmentID,
         Customers.FirstName,
         Customers.LastName,
         Customers.Email,
@@ -216,33 +1022,105 @@ def display_data():
                   # Only select Customers with StatusID equals to 1 (Active customers)
                   ).filter(Customers.StatusID == 1
                             # Only select Rentals with StatusID equals to 1 (Active Rental)
-                            ).filter(Rentals.StatusID == 1
-                                        ).order_by(Customers.CustomerID.desc()).all()
-
-    # Create a list of dictionaries to hold the data for each row
-    data = []
-    for row in query:
-        item = {
-            'CustomerID': row.CustomerID,
-            'FirstName': row.FirstName,
-            'LastName': row.LastName,
-            'Email': row.Email,
-            'Address': row.Address,
-            'Phone': row.Phone,
-            'AltPhone': row.AltPhone,
-            'TDL': row.TDL,
-            # adjust the format as necessary
-            'TDLExpirationDate': row.TDLExpirationDate.strftime('%Y-%m-%d'),
-            'InsuranceExpDate': row.InsuranceExpDate,
-            'EquipmentType': row.EquipmentType,
-            'ReturnDate': row.ReturnDate,
-            'ReturnTime': row.ReturnTime,  # adjust the format as necessary
-            'InternalNote': row.InternalNote,
-            'CustomerNote': row.CustomerNote
-        }
-        data.append(item)
-
-    return render_template('display.html', data=data)
+                            ).filter(Rentals.StatusID == 1)
+
+
+DISPLAY_SEARCHES = ('prefix', 'contains')
+
+
+def filter_display(query, args):
+    """Apply the dashboard's search boxes in ``args`` to a ``display_query()``.
+
+    ``args['search']`` says how. ``prefix``, the default, matches the start of
+    each column so MySQL can answer from the column's index instead of scanning
+    the table. ``contains`` matches anywhere in the column, like the dashboard's
+    old in-page filter did, and scans. The name box also matches "First Last".
+    """
+    search = args.get('search') or 'prefix'
+    if search not in DISPLAY_SEARCHES:
+        raise ValueError('Invalid search')
+    if search == 'contains':
+        # No index helps with a substring, the scan is expected
+        query = query.execution_options(full_scan_ok=True)
+
+    def matches(column, value):
+        if search == 'prefix':
+            return column.startswith(value, autoescape=True)
+        return column.contains(value, autoescape=True)
+
+    name = args.get('name', '').strip()
+    if name:
+        if search == 'prefix':
+            conditions = [matches(Customers.FirstName, name), matches(Customers.LastName, name)]
+            first_name, _, last_name = name.partition(' ')
+            if last_name.strip():
+                conditions.append(and_(Customers.FirstName == first_name, matches(Customers.LastName, last_name.strip())))
+        else:
+            conditions = [matches(Customers.FirstName + ' ' + Customers.LastName, name)]
+        query = query.filter(or_(*conditions))
+    email = args.get('email', '').strip()
+    if email:
+        query = query.filter(matches(Customers.Email, email))
+    phone = args.get('phone', '').strip()
+    if phone:
+        query = query.filter(or_(matches(Customers.Phone, phone), matches(Customers.AltPhone, phone)))
+    equipment_type = args.get('equipment_type', '').strip()
+    if equipment_type:
+        query = query.filter(matches(Equipment.EquipmentType, equipment_type))
+
+    return query
+
+
+def search_display(args):
+    """Return ``(rows, next_cursor, search)`` for one page of active rentals matching the dashboard filters in ``args``.
+
+    Without a ``search`` in ``args`` a first page that no prefix finds is searched
+    again with ``contains``. ``search`` says which one answered, so the next pages
+    can ask for the same.
+    """
+    query, by_ids = filter_row_ids(filter_display(display_query(), args), DISPLAY_ROW_KEYS, args)
+
+    try:
+        limit = MAX_PAGE_SIZE if by_ids else int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid limit')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # A customer can have several active rentals, so RentalID breaks the tie
+    rows, next_cursor = keyset_page(query, Rentals.RentalID, Customers.CustomerID, True, args.get('cursor'), limit)
+    search = args.get('search') or 'prefix'
+    searched = any(args.get(box, '').strip() for box in ('name', 'email', 'phone', 'equipment_type'))
+    if not rows and searched and not args.get('search') and not args.get('cursor') and not by_ids:
+        return search_display(dict(args.items(), search='contains'))
+    return rows, next_cursor, search
+
+
+@app.route('/display', methods=['GET'])
+def display_data():
+    if not current_user.is_authenticated:
+        return redirect(url_for('login'))
+
+    def render():
+        display_rows, next_cursor = cached_rows_fragment('display', DISPLAY_TABLES, 'display_rows.html', lambda: search_display({})[:2])
+        return render_template('display.html', display_rows=display_rows, next_cursor=next_cursor, live=live_tables('display'))
+
+    return conditional_response('display', DISPLAY_TABLES, render)
+
+
+@app.route('/display/search', methods=['GET'])
+def display_search():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    try:
+        rows, next_cursor, search = search_display(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request.args.get('format') == 'html':
+        return jsonify({'html': render_template('display_rows.html', rows=rows), 'next_cursor': next_cursor, 'search': search})
+
+    return jsonify(dict(columnar(display_query(), rows), next_cursor=next_cursor, search=search))
 
 
 ##############################################################################################################################################################################################################################
@@ -254,7 +1132,37 @@ def modals():
     if not current_user.is_authenticated:
         return redirect(url_for('login'))
 
-    customers_query = db.session.query(
+    def render():
+        # Only the first page of each table is rendered here, the page pulls the rest
+        # from /api/<table> on demand (see PAGED_TABLES below)
+        customers_rows, customers_cursor = cached_rows_fragment(
+            'modals-customers', PAGED_TABLES['customers']['tables'], 'customer_rows.html', lambda: paged_rows('customers', {}))
+        rental_rows, rental_cursor = cached_rows_fragment(
+            'modals-rentals', PAGED_TABLES['rentals']['tables'], 'rental_rows.html', lambda: paged_rows('rentals', MODALS_RENTAL_FILTERS))
+        equipment_rows, equipment_cursor = cached_rows_fragment(
+            'modals-equipment', PAGED_TABLES['equipment']['tables'], 'equipment_rows.html', lambda: paged_rows('equipment', {}))
+
+        return render_template('modals.html', customers_rows=customers_rows, equipment_rows=equipment_rows, rental_rows=rental_rows,
+                               customers_cursor=customers_cursor, rental_cursor=rental_cursor, equipment_cursor=equipment_cursor,
+                               rental_filters=MODALS_RENTAL_FILTERS, live=live_tables('customers', 'rentals', 'equipment'))
+
+    tables = {table for name in ('customers', 'rentals', 'equipment') for table in PAGED_TABLES[name]['tables']}
+    return conditional_response('modals', tables, render)
+
+##############################################################################################################################################################################################################################
+#                                                                            TAABLES                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# The "Past Rentals" table on /modals only lists completed rentals of inactive customers
+MODALS_RENTAL_FILTERS = {'CustomerStatusID': 2, 'StatusID': 3}
+
+
+def customers_list_query():
+    return db.session.query(
         Customers.CustomerID,
         Customers.FirstName,
         Customers.LastName,
@@ -272,53 +1180,26 @@ def modals():
         CustomerStatuses.StatusName
     ).join(
         CustomerStatuses, CustomerStatuses.StatusID == Customers.StatusID
-    ).order_by(Customers.CustomerID.desc()).all()
-
-    customers_data = []
-    for row in customers_query:
-        item = {
-            'CustomerID': row.CustomerID,
-            'FirstName': row.FirstName,
-            'LastName': row.LastName,
-            'Email': row.Email,
-            'Phone': row.Phone,
-            'AltPhone': row.AltPhone,
-            'Address': row.Address,
-            'City': row.City,
-            'State': row.State,
-            'Zip': row.Zip,
-            'TDL': row.TDL,
-            'TDLExpirationDate': row.TDLExpirationDate,
-            'InsuranceExpDate': row.InsuranceExpDate,
-            'CustomerNote': row.CustomerNote,
-            'StatusName': row.StatusName,  # Changed from StatusID to StatusName
-        }
-        customers_data.append(item)
-
-    equipment_query = db.session.query(
+    )
+
+
+def equipment_list_query():
+    return db.session.query(
         Equipment.EquipmentID,
         Equipment.EquipmentType,
         Equipment.Condition,
         Equipment.StatusID,
-        EquipmentStatuses.StatusName,
+        EquipmentStatuses.StatusName.label('EquipmentStatusName'),
     ).join(
         EquipmentStatuses, Equipment.StatusID == EquipmentStatuses.StatusID
-    ).all()
+    )
 
-    equipment_data = []
-    for row in equipment_query:
-        item = {
-            'EquipmentID': row.EquipmentID,
-            'EquipmentType': row.EquipmentType,
-            'Condition': row.Condition,
-            'StatusID': row.StatusID,
-            'EquipmentStatusName': row.StatusName,
-        }
-        equipment_data.append(item)
-
-    rental_query = db.session.query(
+
+def rentals_list_query():
+    return db.session.query(
         Rentals.RentalID,
         Customers.CustomerID,
+        Rentals.EquipmentID,
         Customers.FirstName,
         Customers.LastName,
         Equipment.EquipmentType,
@@ -329,31 +1210,11 @@ def modals():
         Rentals.ReturnTime,
         Rentals.InternalNote
     ).join(Customers, Customers.CustomerID == Rentals.CustomerID
-           ).join(Equipment, Equipment.EquipmentID == Rentals.EquipmentID
-                  # Only select Customers with StatusID equals to 2 (Active customers)
-                  ).filter(Customers.StatusID == 2
-                                # Only select Rentals with StatusID equals to 2 (Active Rental)
-                                ).filter(Rentals.StatusID == 3
-                                            ).order_by(Rentals.RentalID.desc()).all()
-
-    rental_data = []
-    for row in rental_query:
-        item = {
-            'RentalID': row.RentalID,
-            'CustomerID': row.CustomerID,  # Including the CustomerID in the item
-            'FirstName': row.FirstName,
-            'LastName': row.LastName,
-            'EquipmentType': row.EquipmentType,
-            'EquipmentStatusID': row.EquipmentStatusID,
-            'RentalDate': row.RentalDate,
-            'ReturnDate': row.ReturnDate,
-            'ReturnTime': row.ReturnTime,
-            'InternalNote': row.InternalNote,
-            'RentalsStatusID': row.RentalsStatusID,
-        }
-        rental_data.append(item)
-
-    vehicles_query = db.session.query(
+           ).join(Equipment, Equipment.EquipmentID == Rentals.EquipmentID)
+
+
+def vehicles_list_query():
+    return db.session.query(
         Vehicles.VehicleID,
         Customers.CustomerID,
         Vehicles.VehicleModel,
@@ -361,170 +1222,576 @@ def modals():
         Vehicles.VehicleYear,
         Vehicles.LicensePlate,
         Vehicles.StatusID,
-    ).join(Customers, Customers.CustomerID == Vehicles.CustomerID
-           ).order_by(Vehicles.VehicleID.desc()).all()
+    ).join(Customers, Customers.CustomerID == Vehicles.CustomerID)
+
+
+# One entry per table served by /api/<table>. "filters" are the query string
+# parameters a caller may filter on (string columns match by prefix so they can
+# use an index, the others by equality) and "sorts" the columns it may order by.
+# Every sort is tie-broken on the primary key so the keyset stays unique.
+# "tables" are the tables the query reads, a write to any of them changes its rows,
+# and "row_keys" the ids a caller may ask for with ?match=<key>&ids=1,2,3.
+PAGED_TABLES = {
+    'customers': {
+        'query': customers_list_query,
+        'tables': ('customers', 'customer_statuses'),
+        'row_keys': {'CustomerID': Customers.CustomerID},
+        'key': Customers.CustomerID,
+        'filters': {
+            'FirstName': Customers.FirstName,
+            'LastName': Customers.LastName,
+            'Email': Customers.Email,
+            'Phone': Customers.Phone,
+            'StatusID': Customers.StatusID,
+        },
+        'sorts': {
+            'CustomerID': Customers.CustomerID,
+            'LastName': Customers.LastName,
+            'TDLExpirationDate': Customers.TDLExpirationDate,
+            'InsuranceExpDate': Customers.InsuranceExpDate,
+        },
+        'rows_template': 'customer_rows.html',
+    },
+    'equipment': {
+        'query': equipment_list_query,
+        'tables': ('equipment', 'equipment_statuses'),
+        'row_keys': {'EquipmentID': Equipment.EquipmentID},
+        'key': Equipment.EquipmentID,
+        'filters': {
+            'EquipmentType': Equipment.EquipmentType,
+            'StatusID': Equipment.StatusID,
+        },
+        'sorts': {
+            'EquipmentID': Equipment.EquipmentID,
+            'EquipmentType': Equipment.EquipmentType,
+        },
+        'rows_template': 'equipment_rows.html',
+    },
+    'rentals': {
+        'query': rentals_list_query,
+        'tables': ('rentals', 'customers', 'equipment'),
+        'row_keys': {'RentalID': Rentals.RentalID, 'CustomerID': Customers.CustomerID, 'EquipmentID': Rentals.EquipmentID},
+        'key': Rentals.RentalID,
+        'filters': {
+            'CustomerID': Rentals.CustomerID,
+            'EquipmentType': Equipment.EquipmentType,
+            'StatusID': Rentals.StatusID,
+            'CustomerStatusID': Customers.StatusID,
+        },
+        'sorts': {
+            'RentalID': Rentals.RentalID,
+            'RentalDate': Rentals.RentalDate,
+            'ReturnDate': Rentals.ReturnDate,
+        },
+        'rows_template': 'rental_rows.html',
+    },
+    'vehicles': {
+        'query': vehicles_list_query,
+        'tables': ('vehicles', 'customers'),
+        'row_keys': {'VehicleID': Vehicles.VehicleID, 'CustomerID': Customers.CustomerID},
+        'key': Vehicles.VehicleID,
+        'filters': {
+            'CustomerID': Vehicles.CustomerID,
+            'LicensePlate': Vehicles.LicensePlate,
+            'StatusID': Vehicles.StatusID,
+        },
+        'sorts': {
+            'VehicleID': Vehicles.VehicleID,
+            'LicensePlate': Vehicles.LicensePlate,
+        },
+        'rows_template': None,
+    },
+}
+
+
+def encode_cursor(sort_value, key_value):
+    if isinstance(sort_value, datetime.date):
+        sort_value = sort_value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_value, key_value]).encode()).decode()
+
+
+def decode_cursor(cursor, sort_column):
+    try:
+        sort_value, key_value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_value is not None and isinstance(sort_column.type, db.Date):
+            sort_value = datetime.date.fromisoformat(sort_value)
+        return sort_value, int(key_value)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def keyset_page(query, key_column, sort_column, descending, cursor, limit):
+    """Return ``(rows, next_cursor)`` for the page of ``query`` that follows ``cursor``.
+
+    Rows are ordered by ``sort_column`` and then ``key_column`` and the page is
+    selected with a "comes after the last row" predicate instead of an OFFSET, so
+    page 1000 costs the same as page 1. NULLs sort first ascending and last
+    descending, which is what both MySQL and SQLite do.
+    """
+    if cursor:
+        sort_value, key_value = decode_cursor(cursor, sort_column)
+        if sort_column is key_column:
+            query = query.filter(key_column < key_value if descending else key_column > key_value)
+        elif sort_value is None:
+            if descending:
+                query = query.filter(sort_column.is_(None), key_column < key_value)
+            else:
+                query = query.filter(or_(and_(sort_column.is_(None), key_column > key_value), sort_column.isnot(None)))
+        elif descending:
+            query = query.filter(or_(sort_column < sort_value, and_(sort_column == sort_value, key_column < key_value),
+                                     sort_column.is_(None)))
+        else:
+            query = query.filter(or_(sort_column > sort_value, and_(sort_column == sort_value, key_column > key_value)))
+
+    if sort_column is key_column:
+        order = [key_column.desc() if descending else key_column.asc()]
+    else:
+        order = [sort_column.desc(), key_column.desc()] if descending else [sort_column.asc(), key_column.asc()]
+
+    # Fetch one extra row to know whether there is a next page
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return rows, encode_cursor(last[sort_column], last[key_column])
+
+
+def paged_rows(table, args):
+    """Apply the filters, sort and cursor found in ``args`` to ``table``'s list query."""
+    spec = PAGED_TABLES[table]
+    query = spec['query']()
+
+    for name, column in spec['filters'].items():
+        value = args.get(name)
+        if value is None or value == '':
+            continue
+        if isinstance(column.type, db.String):
+            query = query.filter(column.startswith(str(value), autoescape=True))
+        else:
+            try:
+                query = query.filter(column == int(value))
+            except (TypeError, ValueError):
+                raise ValueError('Invalid value for ' + name)
+    query, by_ids = filter_row_ids(query, spec['row_keys'], args)
+
+    sort = args.get('sort') or spec['key'].key
+    if sort not in spec['sorts']:
+        raise ValueError('Cannot sort by ' + sort)
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+
+    try:
+        limit = MAX_PAGE_SIZE if by_ids else int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid limit')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    return keyset_page(query, spec['key'], spec['sorts'][sort], order == 'desc', args.get('cursor'), limit)
+
+
+@app.route('/api/<table>', methods=['GET'])
+def list_table(table):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if table not in PAGED_TABLES:
+        return jsonify({'error': 'Unknown table'}), 404
 
-    vehicles_data = []
-    for row in vehicles_query:
-        item = {
-            'VehicleID': row.VehicleID,
-            'CustomerID': row.CustomerID,
-            'VehicleModel': row.VehicleModel,
-            'VehicleMake': row.VehicleMake,
-            'VehicleYear': row.VehicleYear,
-            'LicensePlate': row.LicensePlate,
-            'StatusID': row.StatusID
-        }
-        vehicles_data.append(item)
+    try:
+        rows, next_cursor = paged_rows(table, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # format=html hands back the rendered <tr> rows so the page can append them as-is
+    if request.args.get('format') == 'html':
+        rows_template = PAGED_TABLES[table]['rows_template']
+        if rows_template is None:
+            return jsonify({'error': 'HTML rows are not available for ' + table}), 400
+        return jsonify({'html': render_template(rows_template, rows=rows), 'next_cursor': next_cursor})
 
-    return render_template('modals.html', customers_data=customers_data, equipment_data=equipment_data, rental_data=rental_data, vehicles_data=vehicles_data)
+    return jsonify(dict(columnar(PAGED_TABLES[table]['query'](), rows), next_cursor=next_cursor))
 
 ##############################################################################################################################################################################################################################
-#                                                                            TAABLES                                                                                                                                          #
+#                                                                            PAGINATION                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+def json_default(value):
+    """Write the values the encoder has no JSON type for."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dump_json(data):
+    """``data`` as compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=json_default, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() and |tojson through dump_json().
+
+    Dates and times go out as ISO 8601 strings, where Flask's default writes
+    dates as HTTP dates, so rows can be handed over with their values as read.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return json.dumps(obj, **dict({'default': json_default}, **kwargs))
+        return dump_json(obj).decode()
+
+    def response(self, *args, **kwargs):
+        return self._app.response_class(dump_json(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
+
+
+app.json = FastJSONProvider(app)
+
+
+def columnar(query, rows):
+    """``{'columns': [...], 'rows': [[...], ...]}`` for ``rows`` read with ``query``.
+
+    The column names go out once instead of once per row, and the values as the
+    database returned them (dump_json() knows dates and times).
+    """
+    return {'columns': [column['name'] for column in query.column_descriptions], 'rows': [tuple(row) for row in rows]}
+
+
+# Preferred first when the client accepts several
+RESPONSE_ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/csv', 'text/plain', 'text/css', 'text/javascript'}
+# Fast settings, the bodies are compressed on every request rather than once ahead of time
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+@app.after_request
+def compress_response(response):
+    """Brotli or gzip encode the body for a client whose Accept-Encoding asks for it.
+
+    Streamed bodies (/events, exports, printed batches) go out as they are, and
+    so does anything under COMPRESS_MIN_BYTES.
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.is_streamed or response.direct_passthrough or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    encoding = request.accept_encodings.best_match(RESPONSE_ENCODINGS)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+
+    response.set_data(brotli.compress(body, quality=BROTLI_QUALITY) if encoding == 'br' else gzip.compress(body, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # Same content, other bytes: a weak ETag still answers If-None-Match (see conditional_response())
+        response.set_etag(etag, weak=True)
+    return response
+
+##############################################################################################################################################################################################################################
+#                                                                            RESPONSES                                                                                                                                          #
 ##############################################################################################################################################################################################################################
 
 
 @app.route('/printedPage/<customer_id>')
 def printable_page(customer_id):
     customer_id = int(customer_id)  # Convert to integer
-    # This will return 404 if customer not found
-    customer = Customers.query.get_or_404(customer_id)
-
-    # We can get customer status name directly from the customer object due to defined relationship
-    status_name = customer.status.StatusName
-
-    # Fetch equipment type for this customer's rentals
-    # We assume the customer has only one rental. If the customer can have multiple rentals,
-    # this code needs to be modified to handle that
-    rental = Rentals.query.filter_by(CustomerID=customer_id).first()
-    if rental is not None:
-        equipment_type = rental.equipment.EquipmentType
-    else:
-        equipment_type = None  # or some default value
 
-    # Pass the data to the template
-    return render_template('printedPage.html', row=customer, StatusName=status_name, EquipmentType=equipment_type)
+    # ?async=1 renders it on a job worker, the page then polls /jobs/<id>
+    if request.args.get('async') == '1':
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Not authenticated'}), 401
+        return job_accepted(submit_job('printed_page', {'customer_id': customer_id}, current_user.AgentID))
+
+    html = render_printed_page(customer_id)
+    if html is None:
+        abort(404)
+    return html
+
+
+def agreement_query(customer_ids, rental_filter=None):
+    """One round trip for the customers, their statuses and every rental with its equipment.
+
+    A customer without rentals still comes back once with the rental columns empty.
+    ``rental_filter`` narrows which rentals are listed, not which customers.
+    """
+    rental_join = Rentals.CustomerID == Customers.CustomerID
+    if rental_filter is not None:
+        rental_join = and_(rental_join, rental_filter)
+    return (
+        select(Customers, CustomerStatuses.StatusName, Rentals, Equipment.EquipmentType,
+               RentalStatuses.StatusName.label('RentalStatusName'))
+        .outerjoin(CustomerStatuses, CustomerStatuses.StatusID == Customers.StatusID)
+        .outerjoin(Rentals, rental_join)
+        .outerjoin(Equipment, Equipment.EquipmentID == Rentals.EquipmentID)
+        .outerjoin(RentalStatuses, RentalStatuses.StatusID == Rentals.StatusID)
+        .where(Customers.CustomerID.in_(customer_ids))
+        .order_by(Customers.LastName, Customers.FirstName, Customers.CustomerID, Rentals.RentalID.desc())
+    )
 
 
-##############################################################################################################################################################################################################################
-#                                                                            Printed Page                                                                                                                                          #
-##############################################################################################################################################################################################################################
+def group_agreements(rows):
+    """Turn agreement_query() rows into ``(customer, StatusName, rentals)``, one per customer."""
+    for _, customer_rows in itertools.groupby(rows, key=lambda row: row.Customers.CustomerID):
+        customer_rows = list(customer_rows)
+        yield (customer_rows[0].Customers, customer_rows[0].StatusName,
+               [row for row in customer_rows if row.Rentals is not None])
 
 
-@app.route('/update_customer/<int:id>', methods=['PUT'])
-def update_customer(id):
-    if not current_user.is_authenticated:
-        return jsonify({'error': 'Not authenticated'}), 401
+def render_printed_page(customer_id):
+    """The printable agreement of ``customer_id``, None if there is no such customer."""
+    agreements = list(group_agreements(db.session.execute(agreement_query([customer_id]))))
+    if not agreements:
+        return None
 
-    # Get the customer from the database
-    customer = Customers.query.get(id)
+    row, StatusName, rentals = agreements[0]
 
-    if not customer:
-        # If the customer was not found, return an error
-        return jsonify({'error': 'Customer not found'}), 404
+    # Pass the data to the template
+    return render_template('printedPage.html', row=row, StatusName=StatusName, rentals=rentals)
+
+
+PRINT_BATCH_MAX = 500
+
+
+def printed_batch(args):
+    """Return ``(customer_ids, rental_filter)`` for a batch print, raising ValueError if ``args`` don't say which.
+
+    ``customer_ids=1,2,3`` prints those customers with all their rentals,
+    ``rental_date=today`` (or YYYY-MM-DD) everyone with a rental starting that
+    day, listing only those rentals.
+    """
+    if args.get('customer_ids'):
+        try:
+            customer_ids = list(dict.fromkeys(int(value) for value in args['customer_ids'].split(',')))
+        except ValueError:
+            raise ValueError('customer_ids must be comma separated integers')
+        rental_filter = None
+    elif args.get('rental_date'):
+        try:
+            day = datetime.date.today() if args['rental_date'] == 'today' else datetime.date.fromisoformat(args['rental_date'])
+        except ValueError:
+            raise ValueError('rental_date must be today or YYYY-MM-DD')
+        rental_filter = Rentals.RentalDate == day
+        customer_ids = db.session.execute(
+            select(Rentals.CustomerID).where(rental_filter).distinct().limit(PRINT_BATCH_MAX + 1)
+        ).scalars().all()
+    else:
+        raise ValueError('Give customer_ids or rental_date')
 
-    # Get the updated data from the request
-    data = request.get_json()
+    if len(customer_ids) > PRINT_BATCH_MAX:
+        raise ValueError(f'At most {PRINT_BATCH_MAX} agreements at a time')
+    return customer_ids, rental_filter
 
-    # Update the customer data
-    for key, value in data.items():
-        setattr(customer, key, value)
 
-    try:
-        # Save the changes to the database
-        db.session.commit()
-        return jsonify({'message': 'Customer data updated successfully'})
-    except Exception as e:
-        db.session.rollback()  # Rollback the changes on error
-        print(e)  # print the error to the console
-        return jsonify({'error': 'An error occurred while updating customer data', 'details': str(e)}), 500
+def printed_batch_agreements(customer_ids, rental_filter):
+    # A generator, so the query runs once the document starts streaming, in the
+    # session of the context stream_template() pushes again, and rows are fetched
+    # as it goes out rather than held in memory whole
+    if customer_ids:
+        rows = db.session.execute(agreement_query(customer_ids, rental_filter).execution_options(yield_per=200))
+        yield from group_agreements(rows)
 
 
-@app.route('/update_equipment/<int:id>', methods=['PUT'])
-def update_equipment(id):
+@app.route('/printedPages', methods=['GET'])
+def printable_pages():
+    """Many agreements in one printable document, one per sheet, see printed_batch()."""
     if not current_user.is_authenticated:
-        return jsonify({'error': 'Not authenticated'}), 401
+        return redirect(url_for('login'))
 
-    # Get the equipment from the database
-    equipment = Equipment.query.get(id)
+    try:
+        customer_ids, rental_filter = printed_batch(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    if not equipment:
-        # If the equipment was not found, return an error
-        return jsonify({'error': 'equipment not found'}), 404
+    if request.args.get('async') == '1':
+        return job_accepted(submit_job('printed_pages', {key: request.args[key] for key in ('customer_ids', 'rental_date')
+                                                         if key in request.args}, current_user.AgentID))
 
-    # Get the updated data from the request
-    data = request.get_json()
+    agreements = printed_batch_agreements(customer_ids, rental_filter)
+    return Response(stream_template('printedPages.html', agreements=agreements), mimetype='text/html')
+
+##############################################################################################################################################################################################################################
+#                                                                            Printed Page                                                                                                                                          #
+##############################################################################################################################################################################################################################
 
-    # Update the equipment data
-    for key, value in data.items():
-        setattr(equipment, key, value)
 
+# Columns an agent may edit, per table. Keys outside these (ids, the form's display-only
+# RentalID/EquipmentType, UpdatedByAgentID...) are ignored and reported back. Customer
+# status goes through /changeStatus so its rentals and equipment follow.
+EDITABLE_COLUMNS = {
+    'customers': (Customers, ('FirstName', 'LastName', 'Email', 'Phone', 'AltPhone', 'Address', 'City', 'State', 'Zip',
+                              'TDL', 'TDLExpirationDate', 'InsuranceExpDate', 'LeaseAgreement', 'CustomerNote')),
+    'equipment': (Equipment, ('EquipmentType', 'Condition', 'StatusID')),
+    'rentals': (Rentals, ('RentalDate', 'ReturnDate', 'ReturnTime', 'InternalNote', 'StatusID')),
+    'vehicles': (Vehicles, ('VehicleMake', 'VehicleModel', 'VehicleYear', 'LicensePlate', 'StatusID')),
+}
+# Which lookup a table's StatusID must come from
+EDITABLE_STATUS_LOOKUPS = {'equipment': 'equipment', 'rentals': 'rental', 'vehicles': 'vehicle'}
+BATCH_EDIT_MAX = 1000
+
+
+def plan_row_edit(table, changes):
+    """Return ``(values, ignored)`` for an edit of ``table``, raising ValueError if a value is invalid."""
+    if not isinstance(changes, dict):
+        raise ValueError('changes must be a JSON object')
+    model, editable = EDITABLE_COLUMNS[table]
+    values, ignored, errors = {}, [], []
+    for key, value in changes.items():
+        if key not in editable:
+            ignored.append(key)
+            continue
+        try:
+            values[key] = coerce_value(model.__table__.c[key], value)
+        except ValueError as e:
+            errors.append(str(e))
+    if values.get('StatusID') is not None:
+        statuses, _ = lookup_cache.get()
+        if values['StatusID'] not in dict(statuses[EDITABLE_STATUS_LOOKUPS[table]]['rows']):
+            errors.append(f'StatusID {values["StatusID"]} does not exist')
+    if errors:
+        raise ValueError('; '.join(errors))
+    return values, sorted(ignored)
+
+
+def apply_row_edit(table, row_id, values, agent_id):
+    """UPDATE one row without loading it first, return False if there is no such row.
+
+    With AUDIT_OLD_VALUES the edited columns are read before the UPDATE so the
+    change log gets their old values too.
+    """
+    model, _ = EDITABLE_COLUMNS[table]
+    primary_key = model.__mapper__.primary_key[0]
+    old = None
+    if values and app.config['AUDIT_OLD_VALUES']:
+        old = db.session.execute(select(*(model.__table__.c[key] for key in values)).where(primary_key == row_id)).first()
+        if old is None:
+            return False
+        old = old._asdict()
+    result = db.session.execute(
+        update(model).where(primary_key == row_id).values(UpdatedByAgentID=agent_id, **values)
+        .execution_options(synchronize_session=False, changed_ids=[row_id])
+    )
+    if result.rowcount == 0:
+        return False
+    if values:
+        audit_change(table, row_id, 'update', agent_id, old, values)
+    return True
+
+
+def edit_row_response(table, row_id, label):
+    """Validate the JSON body, apply it to one row and commit, answering like the update routes always have."""
     try:
-        # Save the changes to the database
+        values, ignored = plan_row_edit(table, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if not apply_row_edit(table, row_id, values, current_user.AgentID):
+            db.session.rollback()
+            return jsonify({'error': f'{label} not found'}), 404
         db.session.commit()
-        return jsonify({'message': 'equipment data updated successfully'})
+        return jsonify({'message': f'{label} data updated successfully', 'ignored': ignored})
     except Exception as e:
         db.session.rollback()  # Rollback the changes on error
-        print(e)  # print the error to the console
-        return jsonify({'error': 'An error occurred while updating equipment data', 'details': str(e)}), 500
+        current_app.logger.exception('Update failed')  # log the error with its traceback
+        return jsonify({'error': f'An error occurred while updating {label} data', 'details': str(e)}), 500
 
 
-@app.route('/update_rentals/<int:id>', methods=['PUT'])
-def update_rentals(id):
+@app.route('/api/<table>/<int:row_id>', methods=['PATCH'])
+def patch_row(table, row_id):
     if not current_user.is_authenticated:
         return jsonify({'error': 'Not authenticated'}), 401
+    if table not in EDITABLE_COLUMNS:
+        return jsonify({'error': 'Unknown table'}), 404
+    return edit_row_response(table, row_id, table)
 
-    # Get the rentals from the database
-    rentals = Rentals.query.get(id)
 
-    if not rentals:
-        # If the rentals was not found, return an error
-        return jsonify({'error': 'rentals not found'}), 404
+@app.route('/api/edits', methods=['POST'])
+def batch_edit():
+    """Apply ``{"edits": [{"table": ..., "id": ..., "changes": {...}}, ...]}`` in one transaction.
 
-    # Get the updated data from the request
-    data = request.get_json()
+    Nothing is written unless every edit is valid and finds its row.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
 
-    # Update the rentals data
-    for key, value in data.items():
-        setattr(rentals, key, value)
+    edits = (request.get_json(silent=True) or {}).get('edits')
+    if not isinstance(edits, list) or not edits:
+        return jsonify({'error': 'edits must be a non-empty list'}), 400
+    if len(edits) > BATCH_EDIT_MAX:
+        return jsonify({'error': f'At most {BATCH_EDIT_MAX} edits per request'}), 400
+
+    planned, results = [], []
+    for edit in edits:
+        edit = edit if isinstance(edit, dict) else {}
+        table, row_id = edit.get('table'), edit.get('id')
+        result = {'table': table, 'id': row_id}
+        results.append(result)
+        if table not in EDITABLE_COLUMNS:
+            result.update(status='invalid', error='Unknown table')
+        elif isinstance(row_id, bool) or not isinstance(row_id, int):
+            result.update(status='invalid', error='id must be an integer')
+        else:
+            try:
+                values, result['ignored'] = plan_row_edit(table, edit.get('changes'))
+                planned.append((result, table, row_id, values))
+            except ValueError as e:
+                result.update(status='invalid', error=str(e))
+    if len(planned) < len(edits):
+        return jsonify({'error': 'Some edits are invalid, nothing was saved', 'results': results}), 400
 
     try:
-        # Save the changes to the database
+        for result, table, row_id, values in planned:
+            result['status'] = 'updated' if apply_row_edit(table, row_id, values, current_user.AgentID) else 'not_found'
+        if any(result['status'] == 'not_found' for result in results):
+            db.session.rollback()
+            return jsonify({'error': 'Some rows were not found, nothing was saved', 'results': results}), 404
         db.session.commit()
-        return jsonify({'message': 'rentals data updated successfully'})
+        return jsonify({'message': f'{len(results)} rows updated successfully', 'results': results})
     except Exception as e:
-        db.session.rollback()  # Rollback the changes on error
-        print(e)  # print the error to the console
-        return jsonify({'error': 'An error occurred while updating rentals data', 'details': str(e)}), 500
+        db.session.rollback()
+        current_app.logger.exception('Batch edit failed')
+        return jsonify({'error': 'An error occurred while saving the edits', 'details': str(e)}), 500
 
 
-@app.route('/update_vehicles/<int:id>', methods=['PUT'])
-def update_vehicles(id):
+@app.route('/update_customer/<int:id>', methods=['PUT'])
+def update_customer(id):
     if not current_user.is_authenticated:
         return jsonify({'error': 'Not authenticated'}), 401
+    return edit_row_response('customers', id, 'Customer')
 
-    # Get the vehicles from the database
-    vehicles = Vehicles.query.get(id)
 
-    if not vehicles:
-        # If the vehicles was not found, return an error
-        return jsonify({'error': 'vehicles not found'}), 404
+@app.route('/update_equipment/<int:id>', methods=['PUT'])
+def update_equipment(id):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return edit_row_response('equipment', id, 'equipment')
 
-    # Get the updated data from the request
-    data = request.get_json()
 
-    # Update the vehicles data
-    for key, value in data.items():
-        setattr(vehicles, key, value)
+@app.route('/update_rentals/<int:id>', methods=['PUT'])
+def update_rentals(id):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return edit_row_response('rentals', id, 'rentals')
 
-    try:
-        # Save the changes to the database
-        db.session.commit()
-        return jsonify({'message': 'vehicles data updated successfully'})
-    except Exception as e:
-        db.session.rollback()  # Rollback the changes on error
-        print(e)  # print the error to the console
-        return jsonify({'error': 'An error occurred while updating vehicles data', 'details': str(e)}), 500
+
+@app.route('/update_vehicles/<int:id>', methods=['PUT'])
+def update_vehicles(id):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return edit_row_response('vehicles', id, 'vehicles')
 
 ##############################################################################################################################################################################################################################
 #                                                                            UPDATE                                                                                                                                          #
@@ -533,44 +1800,663 @@ def update_vehicles(id):
 
 @app.route('/availableEquipment', methods=['GET'])
 def available_equipment():
-    available_equipments = Equipment.query.filter_by(StatusID=2).all()
-    result = [equipment.EquipmentType for equipment in available_equipments]
-    return jsonify(result), 200
+    detail = request.args.get('detail') == '1'
+
+    def build():
+        # Each type once, ?detail=1 adds how many units are free and the next ones a booking would get
+        counts = availability_index.counts()
+        if detail:
+            return jsonify([{'EquipmentType': equipment_type, 'available': count,
+                             'next_ids': availability_index.candidates(equipment_type, CLAIM_ATTEMPTS)}
+                            for equipment_type, count in counts.items()]), 200
+        return jsonify(list(counts)), 200
+
+    return conditional_response('availableEquipment-detail' if detail else 'availableEquipment', ('equipment',), build)
+
+
+class LookupCache:
+    """Per-process copy of the status tables.
+
+    The tables are read in one go on first use and kept until a commit writes to
+    one of them (see ``invalidate_lookups``) or ``ttl`` seconds pass, which is how
+    a change made by another worker eventually shows up here.
+    """
+
+    def __init__(self, models, ttl):
+        self.models = models
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._etags = None
+        self._loaded_at = 0
+
+    @property
+    def tables(self):
+        return {model.__table__.name for model in self.models.values()}
+
+    def get(self):
+        """Return ``(data, etags)`` where both are keyed by lookup name, plus ``'all'`` for the etags."""
+        with self._lock:
+            if self._data is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._load()
+            return self._data, self._etags
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def _load(self):
+        data = {}
+        for name, model in self.models.items():
+            rows = db.session.query(model.StatusID, model.StatusName).order_by(model.StatusID).all()
+            data[name] = {'columns': ['id', 'name'], 'rows': [tuple(row) for row in rows]}
+        etags = {name: hashlib.sha1(json.dumps(rows).encode()).hexdigest() for name, rows in data.items()}
+        etags['all'] = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        self._data, self._etags, self._loaded_at = data, etags, time.monotonic()
+
+
+lookup_cache = LookupCache({
+    'agent': AgentStatuses,
+    'customer': CustomerStatuses,
+    'equipment': EquipmentStatuses,
+    'rental': RentalStatuses,
+    'vehicle': VehicleStatuses,
+}, app.config['LOOKUP_CACHE_TTL'])
+
+
+@on_tables_changed
+def invalidate_lookups(tables):
+    if tables & lookup_cache.tables:
+        lookup_cache.invalidate()
+
+
+def lookup_response(name):
+    data, etags = lookup_cache.get()
+    data = data if name == 'all' else data[name]
+    if name != 'all' and request.args.get('format') != 'columnar':
+        # The per-table routes answered [{"id", "name"}, ...] before /lookups went columnar and still do
+        data = [dict(zip(data['columns'], row)) for row in data['rows']]
+    response = jsonify(data)
+    response.set_etag(etags[name])
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config['LOOKUP_CACHE_MAX_AGE']
+    # Answers If-None-Match with a 304 when the browser already has this version
+    return response.make_conditional(request)
+
+
+@app.route('/lookups', methods=['GET'])
+def get_lookups():
+    return lookup_response('all')
 
 
 @app.route('/getEquipment_status_ids', methods=['GET'])
 def get_status_ids_equipment():
-    status_ids = EquipmentStatuses.query.all()
-    return jsonify([{'id': status.StatusID, 'name': status.StatusName} for status in status_ids]), 200
+    return lookup_response('equipment')
 
 
 @app.route('/getCustomer_status_ids', methods=['GET'])
 def get_status_ids_customers():
-    status_ids = CustomerStatuses.query.all()
-    return jsonify([{'id': status.StatusID, 'name': status.StatusName} for status in status_ids]), 200
+    return lookup_response('customer')
 
 
 @app.route('/getRentals_status_ids', methods=['GET'])
 def get_status_ids_rentals():
-    status_ids = RentalStatuses.query.all()
-    return jsonify([{'id': status.StatusID, 'name': status.StatusName} for status in status_ids]), 200
+    return lookup_response('rental')
 
 
 @app.route('/getVehicle_status_ids', methods=['GET'])
 def get_status_ids_vehicles():
-    status_ids = VehicleStatuses.query.all()
-    return jsonify([{'id': status.StatusID, 'name': status.StatusName} for status in status_ids]), 200
+    return lookup_response('vehicle')
 
 ##############################################################################################################################################################################################################################
 #                                                                            GET                                                                                                                                          #
 ##############################################################################################################################################################################################################################
 
 
+def pool_snapshot():
+    """Current state of this worker's connection pool plus the cumulative wait counters."""
+    pool = db.engine.pool
+    snapshot = {'pid': os.getpid(), 'pool': type(pool).__name__}
+    # QueuePool tells how many connections are in use, other pools don't
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            snapshot[name] = getattr(pool, name)()
+    if isinstance(pool, TimedQueuePool):
+        snapshot['max_overflow'] = app.config['DB_MAX_OVERFLOW']
+        snapshot['timeout'] = app.config['DB_POOL_TIMEOUT']
+    snapshot.update(pool_stats.to_dict())
+    return snapshot
+
+
+@app.route('/pool/stats', methods=['GET'])
+def get_pool_stats():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    return jsonify(pool_snapshot())
+
+##############################################################################################################################################################################################################################
+#                                                                            POOL                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}'
+        yield f'{name}_sum{format_labels(labels)} {self.sum}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+
+def format_labels(labels):
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+class RequestMetrics:
+    """Per-endpoint request, SQL and template timings of this worker process.
+
+    Each worker keeps its own numbers, scrape every worker (or run one) to see
+    them all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = collections.defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.statements = collections.defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+        self.requests = collections.Counter()
+        self.db_seconds = collections.Counter()
+        self.response_bytes = collections.Counter()
+        self.render_seconds = collections.Counter()
+        self.renders = collections.Counter()
+
+    def observe(self, endpoint, method, status, seconds, statements, db_seconds, response_bytes, renders):
+        key = (('endpoint', endpoint), ('method', method))
+        with self._lock:
+            self.latency[key].observe(seconds)
+            self.statements[key].observe(statements)
+            self.requests[key + (('status', str(status)),)] += 1
+            self.db_seconds[key] += db_seconds
+            if response_bytes is not None:
+                self.response_bytes[key] += response_bytes
+            for template, render_seconds in renders:
+                render_key = (('endpoint', endpoint), ('template', template))
+                self.render_seconds[render_key] += render_seconds
+                self.renders[render_key] += 1
+
+    def prometheus(self):
+        """Render everything in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            family('http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+            lines.extend(f'http_requests_total{format_labels(key)} {count}' for key, count in sorted(self.requests.items()))
+            family('http_request_duration_seconds', 'histogram', 'Time spent handling a request.')
+            for key, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('http_request_duration_seconds', key))
+            family('http_request_sql_statements', 'histogram', 'SQL statements sent per request.')
+            for key, histogram in sorted(self.statements.items()):
+                lines.extend(histogram.lines('http_request_sql_statements', key))
+            family('http_request_db_seconds_total', 'counter', 'Time spent waiting on SQL statements.')
+            lines.extend(f'http_request_db_seconds_total{format_labels(key)} {value}' for key, value in sorted(self.db_seconds.items()))
+            family('http_response_size_bytes_total', 'counter', 'Bytes sent in response bodies of known length.')
+            lines.extend(f'http_response_size_bytes_total{format_labels(key)} {value}' for key, value in sorted(self.response_bytes.items()))
+            family('template_render_seconds_total', 'counter', 'Time spent in render_template.')
+            lines.extend(f'template_render_seconds_total{format_labels(key)} {value}' for key, value in sorted(self.render_seconds.items()))
+            family('template_renders_total', 'counter', 'render_template calls.')
+            lines.extend(f'template_renders_total{format_labels(key)} {value}' for key, value in sorted(self.renders.items()))
+
+        pool = pool_snapshot()
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if name in pool:
+                family(f'db_pool_{name}', 'gauge', f'Connection pool {name}.')
+                lines.append(f'db_pool_{name} {pool[name]}')
+        for name in ('checkouts', 'timeouts', 'invalidated'):
+            family(f'db_pool_{name}_total', 'counter', f'Connection pool {name}.')
+            lines.append(f'db_pool_{name}_total {pool[name]}')
+        family('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a pooled connection.')
+        lines.append(f'db_pool_wait_seconds_total {pool["wait_seconds_total"]}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+    g.renders = []
+    g.render_started = []
+    g.sql_log = [] if app.config['SLOW_REQUEST_MS'] else None
+
+
+with app.app_context():
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_started = time.perf_counter()
+
+    @event.listens_for(db.engine, 'after_cursor_execute')
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        if context is None or not has_request_context() or 'request_started' not in g:
+            return
+        elapsed = time.perf_counter() - context.metrics_started
+        g.sql_statements += 1
+        g.sql_seconds += elapsed
+        if g.sql_log is not None:
+            g.sql_log.append((elapsed, statement))
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    if 'render_started' in g:
+        g.render_started.append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def record_render(sender, template, context, **extra):
+    if g.get('render_started'):
+        g.renders.append((template.name, time.perf_counter() - g.render_started.pop()))
+
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    # Streamed bodies have no length up front and aren't counted
+    size = None if response.is_streamed else response.calculate_content_length()
+    request_metrics.observe(endpoint, request.method, response.status_code, elapsed,
+                            g.sql_statements, g.sql_seconds, size, g.renders)
+
+    if app.config['SLOW_REQUEST_MS'] and elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+        statements = '\n'.join(f'  {seconds * 1000:.1f} ms  {" ".join(statement.split())}' for seconds, statement in g.sql_log)
+        app.logger.warning('Slow request %s %s took %.1f ms, %d SQL statements (%.1f ms):\n%s', request.method,
+                           request.full_path.rstrip("?"), elapsed * 1000, g.sql_statements, g.sql_seconds * 1000, statements)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    scraper = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token)
+    if not (scraper or current_user.is_authenticated or app.config['METRICS_PUBLIC']):
+        return jsonify({'error': 'Not authenticated'}), 401
+    return Response(request_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+##############################################################################################################################################################################################################################
+#                                                                            METRICS                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+EVENTS_HISTORY = 1000
+EVENTS_KEEPALIVE_SECONDS = 15
+# Lists longer than this go out as "reload the table" instead of row ids
+EVENTS_MAX_IDS = MAX_ROW_IDS
+
+
+class ChangeBroadcaster:
+    """Fans the changes committed in this process out to its open /events streams.
+
+    The last ``history`` events are kept so a browser that reconnects with
+    Last-Event-ID gets what it missed, older gaps come back as None (reload).
+    """
+
+    def __init__(self, history):
+        self.epoch = f'{random.getrandbits(32):08x}'
+        self._condition = threading.Condition()
+        self._events = collections.deque(maxlen=history)
+        self._last_id = 0
+
+    @property
+    def last_id(self):
+        with self._condition:
+            return self._last_id
+
+    def publish(self, payload):
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, payload))
+            self._condition.notify_all()
+
+    def wait(self, after_id, timeout):
+        """Return the events after ``after_id``, waiting up to ``timeout`` for one, or None if some were dropped."""
+        with self._condition:
+            if self._last_id <= after_id:
+                self._condition.wait(timeout)
+            if self._events and self._events[0][0] > after_id + 1:
+                return None
+            return [(event_id, payload) for event_id, payload in self._events if event_id > after_id]
+
+
+change_broadcaster = ChangeBroadcaster(EVENTS_HISTORY)
+# Streams this process holds open, see EVENTS_MAX_STREAMS in the config
+event_stream_slots = threading.BoundedSemaphore(app.config['EVENTS_MAX_STREAMS']) if app.config['EVENTS_MAX_STREAMS'] else None
+
+
+@on_rows_changed
+def broadcast_row_changes(rows):
+    changes = []
+    for table, ids in sorted(rows.items()):
+        if ids is not None and len(ids) > EVENTS_MAX_IDS:
+            ids = None
+        changes.append({'table': table, 'ids': sorted(ids) if ids is not None else None})
+    change_broadcaster.publish(json.dumps({'changes': changes}))
+
+
+def primary_keys():
+    return {model.__table__.name: model.__mapper__.primary_key[0].key for model in db.Model.__subclasses__()}
+
+
+def live_tables(*names):
+    """What templates/live_updates.html needs to know about the tables a page shows."""
+    tables = {}
+    for name in names:
+        spec = {'tables': DISPLAY_TABLES, 'row_keys': DISPLAY_ROW_KEYS} if name == 'display' else PAGED_TABLES[name]
+        tables[name] = {'sources': list(spec['tables']), 'keys': list(spec['row_keys'])}
+    return {'tables': tables, 'primary_keys': primary_keys(), 'poll_seconds': app.config['EVENTS_FALLBACK_POLL_SECONDS']}
+
+
+def event_stream(last_id, reset):
+    # Only plain data is used in here, the stream holds no database connection while it waits
+    yield 'retry: 3000\n\n'
+    hello = {'primary_keys': primary_keys(), 'poll_seconds': app.config['EVENTS_POLL_SECONDS']}
+    yield f'event: hello\ndata: {json.dumps(hello)}\n\n'
+    if reset:
+        yield 'event: reset\ndata: {}\n\n'
+
+    deadline = time.monotonic() + app.config['EVENTS_STREAM_SECONDS']
+    while time.monotonic() < deadline:
+        events = change_broadcaster.wait(last_id, EVENTS_KEEPALIVE_SECONDS)
+        if events is None:
+            last_id = change_broadcaster.last_id
+            yield f'id: {change_broadcaster.epoch}-{last_id}\nevent: reset\ndata: {{}}\n\n'
+        elif not events:
+            yield ': keepalive\n\n'
+        for event_id, payload in events or ():
+            last_id = event_id
+            yield f'id: {change_broadcaster.epoch}-{event_id}\nevent: change\ndata: {payload}\n\n'
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-Sent Events with the rows every commit in this worker changed.
+
+    A stream holds its request thread until it ends, so there are at most
+    EVENTS_MAX_STREAMS per process. Past that the 503 makes the page poll
+    /events/versions instead.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if event_stream_slots is None or not event_stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'No room for another stream, poll /events/versions'}), 503
+
+    # A browser reconnecting to the worker it was on picks up where it left off,
+    # anywhere else (or after a restart) it has to reload its tables
+    epoch, _, seen = request.headers.get('Last-Event-ID', '').partition('-')
+    if epoch == change_broadcaster.epoch and seen.isdigit():
+        last_id, reset = int(seen), False
+    else:
+        last_id, reset = change_broadcaster.last_id, bool(epoch)
+
+    response = Response(event_stream(last_id, reset), mimetype='text/event-stream')
+    response.call_on_close(event_stream_slots.release)
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx would otherwise hold the events back
+    return response
+
+
+@app.route('/events/versions', methods=['GET'])
+def event_versions():
+    """The shared table versions, polled by pages when changes can come from other workers."""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if fragment_cache.store is None:
+        return jsonify({'error': 'Table versions are not tracked with FRAGMENT_CACHE=off'}), 404
+
+    tables = sorted(primary_keys())
+    versions = dict(zip(tables, fragment_cache.store.versions(tables)))
+    return jsonify({'epoch': fragment_cache.store.epoch, 'versions': versions})
+
+##############################################################################################################################################################################################################################
+#                                                                            LIVE UPDATES                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
 AVAILABLE_STATUS_ID = 2
 ACTIVE_STATUS_ID = 1
 RENTED_STATUS_ID = 1
-
-
+# Rentals in these statuses hold their equipment over their dates (booked_over(), the
+# booking calendar, the status cascade and imports), see OPEN_RENTAL_STATUS_IDS in the config
+OPEN_RENTAL_STATUS_IDS = tuple(app.config['OPEN_RENTAL_STATUS_IDS'])
+
+# How many already-claimed candidates claim_equipment() steps over before giving up
+CLAIM_ATTEMPTS = 5
+# How often the availability index is rebuilt from the database, which is how it
+# learns about bookings made by other workers
+app.config['AVAILABILITY_RECONCILE_SECONDS'] = int(os.environ.get('AVAILABILITY_RECONCILE_SECONDS', 60))
+
+
+class AvailabilityIndex:
+    """Available equipment units per type, kept in this process.
+
+    Booking and /availableEquipment read it instead of the equipment table.
+    Commits that touch equipment mark the units they changed (see
+    ``track_equipment_availability``) and the next read looks up only those;
+    every ``reconcile_seconds`` it is rebuilt whole. It can be behind another
+    worker's bookings for that long, which costs a failed claim attempt and
+    never a double booking, because claims stay conditional on the row.
+    """
+
+    def __init__(self, reconcile_seconds):
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        self._units = {}  # EquipmentType -> sorted EquipmentIDs
+        self._types = {}  # EquipmentID -> EquipmentType of every unit in _units
+        self._stale = set()
+        self._loaded_at = None
+
+    def invalidate(self, ids=None):
+        """Look ``ids`` up again on the next read, or everything if ids is None."""
+        with self._lock:
+            if ids is None:
+                self._loaded_at = None
+            else:
+                self._stale.update(ids)
+
+    def counts(self):
+        with self._lock:
+            self._refresh()
+            return {equipment_type: len(self._units[equipment_type]) for equipment_type in sorted(self._units)}
+
+    def candidates(self, equipment_type, limit):
+        """The lowest ``limit`` available EquipmentIDs of ``equipment_type``."""
+        with self._lock:
+            self._refresh()
+            return self._units.get(equipment_type, [])[:limit]
+
+    def claimed(self, equipment_id):
+        # Gone until the database says otherwise, e.g. after the booking rolled back
+        with self._lock:
+            self._remove(equipment_id)
+            self._stale.add(equipment_id)
+
+    def _add(self, equipment_id, equipment_type):
+        bisect.insort(self._units.setdefault(equipment_type, []), equipment_id)
+        self._types[equipment_id] = equipment_type
+
+    def _remove(self, equipment_id):
+        equipment_type = self._types.pop(equipment_id, None)
+        if equipment_type is None:
+            return
+        units = self._units[equipment_type]
+        del units[bisect.bisect_left(units, equipment_id)]
+        if not units:
+            del self._units[equipment_type]
+
+    def _refresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reconcile_seconds:
+            rows = db.session.execute(
+                select(Equipment.EquipmentID, Equipment.EquipmentType).where(Equipment.StatusID == AVAILABLE_STATUS_ID)
+            ).all()
+            self._units, self._types, self._stale = {}, {}, set()
+            for row in sorted(rows):
+                if row.EquipmentType is not None:
+                    self._units.setdefault(row.EquipmentType, []).append(row.EquipmentID)
+                    self._types[row.EquipmentID] = row.EquipmentType
+            self._loaded_at = time.monotonic()
+            return
+
+        stale, self._stale = self._stale, set()
+        for chunk in chunked(sorted(stale), BULK_CHUNK_SIZE):
+            rows = db.session.execute(
+                select(Equipment.EquipmentID, Equipment.EquipmentType, Equipment.StatusID).where(Equipment.EquipmentID.in_(chunk))
+            ).all()
+            for equipment_id in chunk:
+                self._remove(equipment_id)
+            for row in rows:
+                if row.StatusID == AVAILABLE_STATUS_ID and row.EquipmentType is not None:
+                    self._add(row.EquipmentID, row.EquipmentType)
+
+
+availability_index = AvailabilityIndex(app.config['AVAILABILITY_RECONCILE_SECONDS'])
+
+
+@on_rows_changed
+def track_equipment_availability(rows):
+    if 'equipment' in rows:
+        availability_index.invalidate(rows['equipment'])
+
+
+def try_claim(equipment_id, agent_id, start=None, end=None):
+    """Mark ``equipment_id`` as rented if it is still available, return whether it was.
+
+    With a ``start``/``end`` range the unit must also have no open rental booked
+    over it, checked in the same statement (see booked_over()).
+    """
+    conditions = [Equipment.EquipmentID == equipment_id, Equipment.StatusID == AVAILABLE_STATUS_ID]
+    if start is not None or end is not None:
+        conditions.append(~booked_over(start, end).where(Rentals.EquipmentID == Equipment.EquipmentID).exists())
+    claimed = db.session.execute(
+        update(Equipment)
+        .where(*conditions)
+        .values(StatusID=RENTED_STATUS_ID, UpdatedByAgentID=agent_id)
+        .execution_options(synchronize_session=False, changed_ids=[equipment_id])
+    ).rowcount == 1
+    if claimed:
+        availability_index.claimed(equipment_id)
+        audit_change('equipment', equipment_id, 'update', agent_id, {'StatusID': AVAILABLE_STATUS_ID}, {'StatusID': RENTED_STATUS_ID})
+    return claimed
+
+
+def try_reserve(equipment_id, start, end):
+    """Whether ``equipment_id`` is free from ``start`` to ``end``, holding its row lock until commit.
+
+    A future reservation leaves the unit's status alone, so the lock on the
+    equipment row is what keeps two reservations of one unit from both passing
+    the check.
+    """
+    if db.session.get_bind().dialect.name != 'sqlite':
+        # SQLite already holds the database write lock once the booking has inserted anything
+        db.session.execute(select(Equipment.EquipmentID).where(Equipment.EquipmentID == equipment_id).with_for_update())
+    clash = db.session.execute(
+        booked_over(start, end).where(Rentals.EquipmentID == equipment_id).limit(1).with_for_update()
+    ).first()
+    return clash is None
+
+
+def book_equipment(equipment_id, agent_id, start=None, end=None):
+    """Book ``equipment_id`` from ``start`` to ``end``, return whether it was free.
+
+    A booking that starts today or earlier (or has no dates) claims the unit, a
+    later one only checks it is free over its dates, see try_claim() and try_reserve().
+    """
+    if start is None or start <= datetime.date.today():
+        return try_claim(equipment_id, agent_id, start, end)
+    return try_reserve(equipment_id, start, end)
+
+
+def claim_equipment(equipment_type, agent_id, start=None, end=None):
+    """Book one unit of ``equipment_type`` from ``start`` to ``end`` and return its EquipmentID.
+
+    A booking that starts today or earlier (or has no dates) takes a unit that is
+    ready to use now and marks it as rented; one that starts later only needs the
+    unit to be free over its dates and leaves its status alone. Either way the
+    unit has no open rental overlapping the dates.
+
+    The claim is part of the caller's transaction, so it is released again if the
+    caller rolls back. Where the database supports it the candidate row is locked
+    with SKIP LOCKED, so concurrent bookings each get a different unit without
+    waiting on one another; the claim is conditional on the unit still being
+    free either way, so two agents can never end up with the same one.
+    Candidates come from the booking calendar and the availability index first
+    and from the database only when theirs are all gone. Returns None when no
+    unit of that type is free.
+    """
+    current = start is None or start <= datetime.date.today()
+    candidates = booking_calendar.free_units(equipment_type, start, end)
+    if current:
+        ready = set(availability_index.candidates(equipment_type, None))
+        candidates = [equipment_id for equipment_id in candidates if equipment_id in ready]
+    tried = set()
+    for equipment_id in candidates[:CLAIM_ATTEMPTS]:
+        tried.add(equipment_id)
+        if book_equipment(equipment_id, agent_id, start, end):
+            return equipment_id
+
+    # The calendar or the index is behind (another worker booked those units), ask the database
+    candidate_query = select(Equipment.EquipmentID).where(
+        Equipment.EquipmentType == equipment_type,
+        ~booked_over(start, end).where(Rentals.EquipmentID == Equipment.EquipmentID).exists(),
+    ).order_by(Equipment.EquipmentID).limit(1)
+    if current:
+        candidate_query = candidate_query.where(Equipment.StatusID == AVAILABLE_STATUS_ID)
+    if app.config['RESERVATION_SKIP_LOCKED'] and db.session.get_bind().dialect.name != 'sqlite':
+        candidate_query = candidate_query.with_for_update(skip_locked=True)
+
+    for _ in range(CLAIM_ATTEMPTS):
+        equipment_id = db.session.execute(
+            candidate_query.where(Equipment.EquipmentID.notin_(tried)) if tried else candidate_query
+        ).scalar()
+        if equipment_id is None:
+            return None
+        tried.add(equipment_id)
+        if book_equipment(equipment_id, agent_id, start, end):
+            return equipment_id
+    return None
+
+
+def booking_dates(data):
+    """Return ``(RentalDate, ReturnDate)`` from a request, raising ValueError if they don't make a range."""
+    start = coerce_value(Rentals.RentalDate, data.get('RentalDate'))
+    end = coerce_value(Rentals.ReturnDate, data.get('ReturnDate'))
+    if start is not None and end is not None and end < start:
+        raise ValueError('ReturnDate is before RentalDate')
+    return start, end
 
 
 @app.route('/create_customer', methods=['POST'])
@@ -587,54 +2473,59 @@ def create_customer():
     if missing_fields:
         return jsonify({'error': 'Missing required fields', 'fields': missing_fields}), 400
 
-    equipment_type = data['EquipmentType']
-    available_equipment = Equipment.query.filter_by(
-    EquipmentType=equipment_type, StatusID=AVAILABLE_STATUS_ID).first()
-
-    if not available_equipment:
-        return jsonify({'error': 'No available equipment found for the given type'}), 404
-
-    # Update the equipment's status to indicate it's rented or unavailable
-    available_equipment.StatusID = RENTED_STATUS_ID
-    db.session.add(available_equipment)
-
-    # Create a new Customer instance
-    new_customer = Customers(
-        FirstName=data['FirstName'],
-        LastName=data['LastName'],
-        Email=data['Email'],
-        Address=data['Address'],
-        City=data['City'],
-        State=data['State'],
-        Zip=data['Zip'],
-        Phone=data['Phone'],
-        AltPhone=data['AltPhone'],
-        TDL=data['TDL'],
-        TDLExpirationDate=data['TDLExpirationDate'],
-        InsuranceExpDate=data['InsuranceExpDate'],
-        CustomerNote=data['CustomerNote'],
-        StatusID=ACTIVE_STATUS_ID,
-        UpdatedByAgentID=current_user.AgentID
-    )
-    db.session.add(new_customer)
-    db.session.commit()  # Commit here to get the CustomerID
-
-    # Create a new Rental instance linking the customer and equipment
-    new_rental = Rentals(
-        CustomerID=new_customer.CustomerID,
-        RentalDate=data['RentalDate'],
-        ReturnDate=data['ReturnDate'],
-        ReturnTime=data['ReturnTime'],
-        InternalNote=data['InternalNote'],
-        StatusID=ACTIVE_STATUS_ID,
-        EquipmentID=available_equipment.EquipmentID,
-        UpdatedByAgentID=current_user.AgentID
-    )
-    db.session.add(new_rental)
-    
     try:
+        dates = {key: coerce_value(column, data[key]) for key, column in (
+            ('TDLExpirationDate', Customers.TDLExpirationDate), ('InsuranceExpDate', Customers.InsuranceExpDate))}
+        dates['RentalDate'], dates['ReturnDate'] = booking_dates(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The customer, the rental and the equipment claim are committed together, so a
+    # failure part way through leaves nothing behind
+    try:
+        new_customer = Customers(
+            FirstName=data['FirstName'],
+            LastName=data['LastName'],
+            Email=data['Email'],
+            Address=data['Address'],
+            City=data['City'],
+            State=data['State'],
+            Zip=data['Zip'],
+            Phone=data['Phone'],
+            AltPhone=data['AltPhone'],
+            TDL=data['TDL'],
+            TDLExpirationDate=dates['TDLExpirationDate'],
+            InsuranceExpDate=dates['InsuranceExpDate'],
+            CustomerNote=data['CustomerNote'],
+            StatusID=ACTIVE_STATUS_ID,
+            UpdatedByAgentID=current_user.AgentID
+        )
+        db.session.add(new_customer)
+        db.session.flush()  # Assigns the CustomerID without committing
+
+        # Claimed last so the equipment row stays locked for as short as possible
+        equipment_id = claim_equipment(data['EquipmentType'], current_user.AgentID, dates['RentalDate'], dates['ReturnDate'])
+        if equipment_id is None:
+            db.session.rollback()
+            return jsonify({'error': 'No available equipment found for the given type'}), 404
+
+        new_rental = Rentals(
+            CustomerID=new_customer.CustomerID,
+            RentalDate=dates['RentalDate'],
+            ReturnDate=dates['ReturnDate'],
+            ReturnTime=data['ReturnTime'],
+            InternalNote=data['InternalNote'],
+            StatusID=ACTIVE_STATUS_ID,
+            EquipmentID=equipment_id,
+            UpdatedByAgentID=current_user.AgentID
+        )
+        db.session.add(new_rental)
+        db.session.flush()
+        audit_created(new_customer, current_user.AgentID)
+        audit_created(new_rental, current_user.AgentID)
+        customer_id = new_customer.CustomerID  # read before commit() expires the object
         db.session.commit()
-        return jsonify({'message': 'New customer and rental added successfully!', 'customer_id': new_customer.CustomerID}), 200
+        return jsonify({'message': 'New customer and rental added successfully!', 'customer_id': customer_id}), 200
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"An error occurred: {str(e)}")  # Logging the error
@@ -655,6 +2546,8 @@ def create_equipment():
     db.session.add(new_equipment)
     
     try:
+        db.session.flush()
+        audit_created(new_equipment, current_user.AgentID)
         db.session.commit()
         return jsonify({'message': 'New equipment added successfully!'}), 200
     except Exception as e:
@@ -664,26 +2557,53 @@ def create_equipment():
 
 @app.route('/create_rental', methods=['POST'])
 def create_rental():
+    """Book a rental on a given EquipmentID, or on any free unit of an EquipmentType.
+
+    Future dates make a reservation. Either way the unit must be free over the
+    dates, see claim_equipment().
+    """
     if not current_user.is_authenticated:
         return jsonify({'error': 'Not authenticated'}), 401
     data = request.get_json()
 
-    new_rental = Rentals(
-        CustomerID=data['CustomerID'],
-        EquipmentID=data['EquipmentID'],
-        RentalDate=data['RentalDate'],
-        ReturnDate=data['ReturnDate'],
-        ReturnTime=data['ReturnTime'],
-        InternalNote=data['InternalNote'],
-        StatusID=data['StatusID']
-    )
-    db.session.add(new_rental)
     try:
+        start, end = booking_dates(data)
+        status_id = coerce_value(Rentals.StatusID, data.get('StatusID')) or ACTIVE_STATUS_ID
+        equipment_id = coerce_value(Rentals.EquipmentID, data.get('EquipmentID'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # A completed rental is history and books nothing
+        if status_id in OPEN_RENTAL_STATUS_IDS and equipment_id is not None:
+            if not book_equipment(equipment_id, current_user.AgentID, start, end):
+                db.session.rollback()
+                return jsonify({'error': 'That equipment is not free for those dates'}), 409
+        elif status_id in OPEN_RENTAL_STATUS_IDS:
+            equipment_id = claim_equipment(data.get('EquipmentType'), current_user.AgentID, start, end)
+            if equipment_id is None:
+                db.session.rollback()
+                return jsonify({'error': 'No available equipment found for the given type'}), 404
+
+        new_rental = Rentals(
+            CustomerID=data['CustomerID'],
+            EquipmentID=equipment_id,
+            RentalDate=start,
+            ReturnDate=end,
+            ReturnTime=data['ReturnTime'],
+            InternalNote=data['InternalNote'],
+            StatusID=status_id,
+            UpdatedByAgentID=current_user.AgentID
+        )
+        db.session.add(new_rental)
+        db.session.flush()
+        audit_created(new_rental, current_user.AgentID)
+        rental_id = new_rental.RentalID
         db.session.commit()
-        return jsonify({'message': 'New customer added successfully!'}), 200
+        return jsonify({'message': 'New rental added successfully!', 'rental_id': rental_id, 'equipment_id': equipment_id}), 200
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': 'An error occurred while creating new customer', 'details': str(e)}), 500
+        return jsonify({'error': 'An error occurred while creating new rental', 'details': str(e)}), 500
 
 
 @app.route('/create_vehicle', methods=['POST'])
@@ -702,6 +2622,8 @@ def create_vehicle():
     )
     db.session.add(new_vehicle)
     try:
+        db.session.flush()
+        audit_created(new_vehicle, current_user.AgentID)
         db.session.commit()
         return jsonify({'message': 'New vehicle added successfully!'}), 200
     except Exception as e:
@@ -713,6 +2635,102 @@ def create_vehicle():
 #                                                                            CREATE                                                                                                                                          #
 ##############################################################################################################################################################################################################################
 
+ACTIVE_CUSTOMER_STATUS_ID = 1
+INACTIVE_CUSTOMER_STATUS_ID = 2
+COMPLETED_RENTAL_STATUS_ID = 3
+
+CUSTOMER_STATUS_IDS = {'Active': ACTIVE_CUSTOMER_STATUS_ID, 'Inactive': INACTIVE_CUSTOMER_STATUS_ID}
+
+# IN lists are sent in chunks of this many ids, and one request may carry at most BULK_STATUS_MAX_IDS
+BULK_CHUNK_SIZE = 500
+BULK_STATUS_MAX_IDS = 5000
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def change_customer_statuses(customer_ids, status_string, agent_id):
+    """Set the status of every customer in ``customer_ids`` and return ``{customer_id: result}``.
+
+    When customers are made inactive their open rentals are completed and the
+    equipment on the ones that have started is made ready to use again, unless
+    another open rental has it out today. Everything is done with a few
+    set-based statements per chunk of ids instead of a query per rental; the
+    caller commits.
+    """
+    status_id = CUSTOMER_STATUS_IDS[status_string]
+    results = {}
+
+    for chunk in chunked(customer_ids, BULK_CHUNK_SIZE):
+        old_statuses = dict(db.session.execute(
+            select(Customers.CustomerID, Customers.StatusID).where(Customers.CustomerID.in_(chunk))
+        ).all())
+        found = set(old_statuses)
+        for customer_id in chunk:
+            results[customer_id] = 'updated' if customer_id in found else 'not_found'
+        if not found:
+            continue
+
+        db.session.execute(
+            update(Customers).where(Customers.CustomerID.in_(found))
+            .values(StatusID=status_id, UpdatedByAgentID=agent_id)
+            .execution_options(synchronize_session=False, changed_ids=found)
+        )
+        for customer_id in found:
+            audit_change('customers', customer_id, 'change_status', agent_id,
+                         {'StatusID': old_statuses[customer_id]}, {'StatusID': status_id})
+
+        if status_id != INACTIVE_CUSTOMER_STATUS_ID:
+            continue
+
+        # Rentals that are already completed keep their status and, more importantly,
+        # don't release equipment that may be out with another customer by now
+        open_rentals = db.session.execute(
+            select(Rentals.RentalID, Rentals.StatusID, Rentals.EquipmentID, Rentals.RentalDate,
+                   Equipment.StatusID.label('EquipmentStatusID'))
+            .outerjoin(Equipment, Equipment.EquipmentID == Rentals.EquipmentID)
+            .where(Rentals.CustomerID.in_(found),
+                   or_(Rentals.StatusID != COMPLETED_RENTAL_STATUS_ID, Rentals.StatusID.is_(None)))
+        ).all()
+        rental_ids = [row.RentalID for row in open_rentals]
+        # A reservation that hasn't started never took its unit, which may be out on someone else's rental
+        today = datetime.date.today()
+        equipment_statuses = {row.EquipmentID: row.EquipmentStatusID for row in open_rentals
+                              if row.EquipmentID is not None and (row.RentalDate is None or row.RentalDate <= today)}
+
+        if rental_ids:
+            db.session.execute(
+                update(Rentals).where(Rentals.RentalID.in_(rental_ids))
+                .values(StatusID=COMPLETED_RENTAL_STATUS_ID, UpdatedByAgentID=agent_id)
+                .execution_options(synchronize_session=False, changed_ids=rental_ids)
+            )
+            for row in open_rentals:
+                audit_change('rentals', row.RentalID, 'change_status', agent_id,
+                             {'StatusID': row.StatusID}, {'StatusID': COMPLETED_RENTAL_STATUS_ID})
+        if equipment_statuses:
+            # The rentals above are completed by now, so these are other rentals still holding the unit today
+            still_out = set(db.session.execute(
+                booked_over(today, today).with_only_columns(Rentals.EquipmentID)
+                .where(Rentals.EquipmentID.in_(list(equipment_statuses)))
+            ).scalars())
+            for equipment_id in still_out:
+                del equipment_statuses[equipment_id]
+        equipment_ids = set(equipment_statuses)
+        if equipment_ids:
+            db.session.execute(
+                update(Equipment).where(Equipment.EquipmentID.in_(equipment_ids))
+                .values(StatusID=AVAILABLE_STATUS_ID, UpdatedByAgentID=agent_id)
+                .execution_options(synchronize_session=False, changed_ids=equipment_ids)
+            )
+            for equipment_id, old_status in equipment_statuses.items():
+                audit_change('equipment', equipment_id, 'change_status', agent_id,
+                             {'StatusID': old_status}, {'StatusID': AVAILABLE_STATUS_ID})
+
+    return results
+
+
 @app.route('/changeStatus', methods=['POST'])
 def change_status():
     if not current_user.is_authenticated:
@@ -722,40 +2740,23 @@ def change_status():
     customer_id = request.form.get('customerId')
     status_string = request.form.get('status')
 
-    # Convert the status from string to integer
-    if status_string == "Inactive":
-        status_id = 2
-    elif status_string == "Active":
-        status_id = 1
-    else:
+    if status_string not in CUSTOMER_STATUS_IDS:
         return jsonify({'error': 'Invalid status'}), 400
 
-    # Get the customer from the database
-    customer = Customers.query.get(customer_id)
-
-    if not customer:
-        # If the customer was not found, return an error
+    try:
+        customer_id = int(customer_id)
+    except (TypeError, ValueError):
         return jsonify({'error': 'Customer not found'}), 404
 
-    # Update the status and the agent who updated it for the customer
-    customer.StatusID = status_id
-    customer.UpdatedByAgentID = current_user.AgentID
-
-        # If the customer status is set to Inactive
-    if status_string == "Inactive":
-        # Update the customer's related rentals and their equipment
-        rentals = Rentals.query.filter_by(CustomerID=customer.CustomerID).all()
-        for rental in rentals:
-            rental.StatusID = 3  # Setting rental status to Completed
-            rental.UpdatedByAgentID = current_user.AgentID  # Logging the agent who updated the rental
-            
-            equipment = Equipment.query.get(rental.EquipmentID)
-            if equipment:
-                equipment.StatusID = 2  # Setting equipment status to "Ready to use"
-                equipment.UpdatedByAgentID = current_user.AgentID  # Logging the agent who updated the equipment
-
+    if request.args.get('async') == '1':
+        return job_accepted(submit_job('change_status', {'customer_ids': [customer_id], 'status': status_string}, current_user.AgentID))
 
     try:
+        results = change_customer_statuses([customer_id], status_string, current_user.AgentID)
+        if results[customer_id] == 'not_found':
+            db.session.rollback()
+            return jsonify({'error': 'Customer not found'}), 404
+
         # Save the changes to the database
         db.session.commit()
         return jsonify({'message': 'Customer, rentals, and equipment statuses updated successfully'})
@@ -765,6 +2766,55 @@ def change_status():
         return jsonify({'error': 'An error occurred while updating statuses', 'details': str(e)}), 500
 
 
+@app.route('/changeStatus/bulk', methods=['POST'])
+def change_status_bulk():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    data = request.get_json(silent=True) or {}
+    status_string = data.get('status')
+    raw_ids = data.get('customer_ids')
+
+    if status_string not in CUSTOMER_STATUS_IDS:
+        return jsonify({'error': 'Invalid status'}), 400
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return jsonify({'error': 'customer_ids must be a non-empty list'}), 400
+    if len(raw_ids) > BULK_STATUS_MAX_IDS:
+        return jsonify({'error': f'At most {BULK_STATUS_MAX_IDS} customers per request'}), 400
+
+    results = {}
+    customer_ids = []
+    for raw_id in raw_ids:
+        try:
+            customer_id = int(raw_id)
+        except (TypeError, ValueError):
+            results[str(raw_id)] = 'invalid'
+            continue
+        if customer_id not in results:
+            results[customer_id] = None
+            customer_ids.append(customer_id)
+
+    if request.args.get('async') == '1':
+        invalid = [customer_id for customer_id, result in results.items() if result == 'invalid']
+        return job_accepted(submit_job('change_status', {'customer_ids': customer_ids, 'status': status_string, 'invalid': invalid},
+                                       current_user.AgentID))
+
+    try:
+        results.update(change_customer_statuses(customer_ids, status_string, current_user.AgentID))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"An error occurred: {str(e)}")
+        return jsonify({'error': 'An error occurred while updating statuses', 'details': str(e)}), 500
+
+    return jsonify(bulk_status_report(results))
+
+
+def bulk_status_report(results):
+    return {
+        'updated': sum(1 for result in results.values() if result == 'updated'),
+        'results': [{'customer_id': customer_id, 'result': result} for customer_id, result in results.items()],
+    }
 
 
 ##############################################################################################################################################################################################################################
@@ -772,6 +2822,2091 @@ def change_status():
 ##############################################################################################################################################################################################################################
 
 
+IMPORT_BATCH_SIZE = 500
+# Only the first this many bad lines are reported back, the rest are just counted
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# What each entity needs to be imported. "foreign_keys" are checked once per batch
+# with a single IN query, "defaults" fill in columns the file leaves out.
+IMPORT_SPECS = {
+    'customers': {
+        'model': Customers,
+        'required': ['FirstName', 'LastName'],
+        'defaults': {'StatusID': ACTIVE_STATUS_ID},
+        'foreign_keys': {},
+    },
+    'equipment': {
+        'model': Equipment,
+        'required': ['EquipmentType'],
+        'defaults': {'StatusID': AVAILABLE_STATUS_ID},
+        'foreign_keys': {},
+    },
+    'rentals': {
+        'model': Rentals,
+        'required': ['CustomerID'],
+        'defaults': {'StatusID': ACTIVE_STATUS_ID},
+        'foreign_keys': {'CustomerID': Customers.CustomerID, 'EquipmentID': Equipment.EquipmentID},
+    },
+    'vehicles': {
+        'model': Vehicles,
+        'required': ['CustomerID'],
+        'defaults': {},
+        'foreign_keys': {'CustomerID': Customers.CustomerID},
+    },
+}
+
+
+def coerce_value(column, value):
+    """Convert a JSON/CSV value to what ``column`` stores, raising ValueError if it can't."""
+    if value is None or value == '':
+        return None
+    if isinstance(column.type, db.Integer):
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(f'{column.key} must be an integer')
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{column.key} must be an integer')
+    if isinstance(column.type, db.Date):
+        if isinstance(value, datetime.date):
+            return value
+        try:
+            return datetime.date.fromisoformat(str(value)[:10])
+        except ValueError:
+            raise ValueError(f'{column.key} must be a YYYY-MM-DD date')
+    if isinstance(column.type, db.String):
+        if isinstance(value, (dict, list)):
+            raise ValueError(f'{column.key} must be text')
+        value = str(value)
+        if column.type.length and len(value) > column.type.length:
+            raise ValueError(f'{column.key} is longer than {column.type.length} characters')
+        return value
+    return value
+
+
+def validate_import_record(entity, record):
+    """Return the column values for one imported ``record`` or raise ValueError."""
+    spec = IMPORT_SPECS[entity]
+    columns = spec['model'].__table__.columns
+    if not isinstance(record, dict):
+        raise ValueError('Each record must be an object')
+
+    values = dict(spec['defaults'])
+    for key, value in record.items():
+        # Rentals may name the kind of equipment instead of a unit, it's resolved per batch
+        if entity == 'rentals' and key == 'EquipmentType':
+            if value not in (None, ''):
+                values[key] = str(value)
+            continue
+        if key not in columns:
+            raise ValueError(f'Unknown field {key}')
+        coerced = coerce_value(columns[key], value)
+        if coerced is not None or key not in values:
+            values[key] = coerced
+
+    missing = [field for field in spec['required'] if values.get(field) is None]
+    if missing:
+        raise ValueError('Missing required fields: ' + ', '.join(missing))
+    if entity == 'rentals' and values.get('EquipmentID') is None and 'EquipmentType' not in values:
+        raise ValueError('Rentals need an EquipmentID or an EquipmentType')
+    return values
+
+
+def iter_import_records(stream, fmt):
+    """Yield ``(line_number, record)`` from a text ``stream`` one line at a time.
+
+    ``record`` is an exception instead of a dict for lines that can't be parsed.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'Invalid JSON: {e}')
+
+
+class ImportReport:
+    def __init__(self):
+        self.lines = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def to_dict(self):
+        return {'lines': self.lines, 'inserted': self.inserted, 'error_count': self.error_count, 'errors': self.errors}
+
+
+def insert_import_rows(model, rows, agent_id):
+    """Insert ``rows``, booking the equipment of open rentals like /create_rental does.
+
+    Rows that book nothing go in with one executemany. An open rental is booked
+    and inserted on its own so the next one's date check sees it, and raises
+    ValueError when its unit isn't free over its dates.
+    """
+    bookings = [row for row in rows if '_books' in row]
+    for row in rows:
+        row.setdefault('UpdatedByAgentID', agent_id)
+    plain = [row for row in rows if '_books' not in row]
+    if plain:
+        db.session.execute(insert(model), plain)
+    for row in bookings:
+        equipment_type = row.pop('_books')
+        start, end = row.get('RentalDate'), row.get('ReturnDate')
+        if row.get('EquipmentID') is None:
+            row['EquipmentID'] = claim_equipment(equipment_type, agent_id, start, end)
+            if row['EquipmentID'] is None:
+                raise ValueError(f'No {equipment_type} is free for those dates')
+        elif not book_equipment(row['EquipmentID'], agent_id, start, end):
+            raise ValueError(f'Equipment {row["EquipmentID"]} is not free for those dates')
+        db.session.execute(insert(model), row)
+
+
+def flush_import_batch(entity, batch, agent_id, report):
+    """Check foreign keys for a batch of ``(line_number, values)``, insert and commit it."""
+    spec = IMPORT_SPECS[entity]
+
+    for key, column in spec['foreign_keys'].items():
+        wanted = {values[key] for _, values in batch if values.get(key) is not None}
+        if not wanted:
+            continue
+        existing = set(db.session.execute(select(column).where(column.in_(wanted))).scalars())
+        kept = []
+        for line_number, values in batch:
+            if values.get(key) is not None and values[key] not in existing:
+                report.error(line_number, f'{key} {values[key]} does not exist')
+            else:
+                kept.append((line_number, values))
+        batch = kept
+
+    if entity == 'rentals':
+        kept = []
+        for line_number, values in batch:
+            equipment_type = values.pop('EquipmentType', None)
+            if values.get('StatusID') in OPEN_RENTAL_STATUS_IDS:
+                # Booked over its dates when it is inserted, see insert_import_rows()
+                values['_books'] = equipment_type
+            elif values.get('EquipmentID') is None:
+                # History books nothing, and any unit picked for it now would be made up
+                report.error(line_number, 'A rental that is not open needs the EquipmentID that was out')
+                continue
+            kept.append((line_number, values))
+        batch = kept
+
+    if not batch:
+        return
+
+    try:
+        insert_import_rows(spec['model'], [dict(values) for _, values in batch], agent_id)
+        db.session.commit()
+        report.inserted += len(batch)
+        return
+    except Exception:
+        db.session.rollback()
+
+    # Something in the batch was rejected by the database, retry row by row to find it
+    for line_number, values in batch:
+        try:
+            with db.session.begin_nested():
+                insert_import_rows(spec['model'], [dict(values)], agent_id)
+            report.inserted += 1
+        except Exception as e:
+            report.error(line_number, str(getattr(e, 'orig', e)))
+    db.session.commit()
+
+
+def import_records(entity, records, batch_size=IMPORT_BATCH_SIZE, agent_id=None):
+    """Validate and insert ``(line_number, record)`` pairs ``batch_size`` rows at a time.
+
+    Bad lines are reported and skipped, they never abort the load. Each batch is
+    committed on its own, so a large file is never held in memory or in one
+    transaction.
+    """
+    report = ImportReport()
+    batch = []
+
+    for line_number, record in records:
+        report.lines += 1
+        if isinstance(record, Exception):
+            report.error(line_number, str(record))
+            continue
+        try:
+            batch.append((line_number, validate_import_record(entity, record)))
+        except ValueError as e:
+            report.error(line_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush_import_batch(entity, batch, agent_id, report)
+            batch = []
+
+    if batch:
+        flush_import_batch(entity, batch, agent_id, report)
+    return report
+
+
+@app.route('/import/<entity>', methods=['POST'])
+def import_data(entity):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if entity not in IMPORT_SPECS:
+        return jsonify({'error': 'Unknown entity'}), 404
+
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    try:
+        batch_size = max(1, int(request.args.get('batch_size', IMPORT_BATCH_SIZE)))
+    except ValueError:
+        return jsonify({'error': 'Invalid batch_size'}), 400
+
+    # Read the body as it arrives instead of loading it all
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    report = import_records(entity, iter_import_records(stream, fmt), batch_size, current_user.AgentID)
+    return jsonify(report.to_dict()), 200
+
+
+@app.cli.command('import-data')
+@click.argument('entity', type=click.Choice(list(IMPORT_SPECS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@click.option('--agent-id', type=int, help='Recorded as UpdatedByAgentID on the new rows.')
+def import_data_command(entity, path, fmt, batch_size, agent_id):
+    """Bulk load ENTITY rows from a JSONL or CSV file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, encoding='utf-8', newline='') as stream:
+        report = import_records(entity, iter_import_records(stream, fmt), batch_size, agent_id)
+    for error in report.errors:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f'{report.inserted} of {report.lines} lines imported, {report.error_count} errors')
+
+##############################################################################################################################################################################################################################
+#                                                                            IMPORT                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+# Rows fetched from the server-side cursor at a time, and bytes buffered before a chunk is sent
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_TABLES = {
+    'customers': Customers,
+    'equipment': Equipment,
+    'rentals': Rentals,
+    'vehicles': Vehicles,
+}
+
+
+def stream_rows(query):
+    """Yield the rows of ``query`` ``EXPORT_FETCH_SIZE`` at a time from a server-side cursor."""
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(columns, rows):
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, map(export_value, row)))) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    yield ''.join(lines)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(name, query, columns):
+    """Stream ``query`` as a CSV or JSONL download without holding its rows in memory."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+
+    rows = stream_rows(query)
+    chunks = (chunk.encode('utf-8') for chunk in (csv_chunks if fmt == 'csv' else jsonl_chunks)(columns, rows))
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f'{name}-{datetime.date.today().isoformat()}.{fmt}'
+    if request.args.get('gzip') == '1':
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.route('/export/display', methods=['GET'])
+def export_display():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    # Same rows and search boxes as the dashboard, in the same order
+    try:
+        query = filter_display(display_query(), request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = query.order_by(Customers.CustomerID.desc(), Rentals.RentalID.desc())
+    columns = [column['name'] for column in query.column_descriptions]
+    return export_response('active-rentals', query.statement, columns)
+
+
+@app.route('/export/<table>', methods=['GET'])
+def export_table(table):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': 'Unknown table'}), 404
+
+    model = EXPORT_TABLES[table]
+    columns = [column.key for column in model.__table__.columns]
+    query = select(*model.__table__.columns).order_by(*model.__table__.primary_key.columns)
+    return export_response(table, query, columns)
+
+##############################################################################################################################################################################################################################
+#                                                                            EXPORT                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+def scan_expiry_alerts(today=None):
+    """Rewrite the expiry_alerts table from the customers and rentals that need attention.
+
+    Only active customers and active rentals are looked at, each with one range
+    read of a (StatusID, date) index, so the scan costs a few index lookups no
+    matter how many customers there are. Returns the number of alerts per type.
+    """
+    today = today or datetime.date.today()
+    scanned_at = datetime.datetime.now()
+    alerts = []
+
+    for alert_type, column, days in (('tdl', Customers.TDLExpirationDate, app.config['ALERT_TDL_DAYS']),
+                                     ('insurance', Customers.InsuranceExpDate, app.config['ALERT_INSURANCE_DAYS'])):
+        rows = db.session.execute(
+            select(Customers.CustomerID, column.label('DueDate'))
+            .where(Customers.StatusID == ACTIVE_CUSTOMER_STATUS_ID, column <= today + datetime.timedelta(days=days))
+        ).all()
+        alerts.extend({'AlertType': alert_type, 'AlertState': 'expired' if row.DueDate < today else 'expiring',
+                       'CustomerID': row.CustomerID, 'RentalID': None, 'DueDate': row.DueDate, 'ScannedAt': scanned_at}
+                      for row in rows)
+
+    rows = db.session.execute(
+        select(Rentals.RentalID, Rentals.CustomerID, Rentals.ReturnDate)
+        .where(Rentals.StatusID == ACTIVE_STATUS_ID,
+               Rentals.ReturnDate <= today + datetime.timedelta(days=app.config['ALERT_RETURN_DAYS']))
+    ).all()
+    alerts.extend({'AlertType': 'return', 'AlertState': 'overdue' if row.ReturnDate < today else 'due',
+                   'CustomerID': row.CustomerID, 'RentalID': row.RentalID, 'DueDate': row.ReturnDate, 'ScannedAt': scanned_at}
+                  for row in rows if row.CustomerID is not None)
+
+    # Replaced in one transaction, readers see the old set or the new one
+    db.session.execute(delete(ExpiryAlerts))
+    for chunk in chunked(alerts, IMPORT_BATCH_SIZE):
+        db.session.execute(insert(ExpiryAlerts), chunk)
+    db.session.commit()
+    return collections.Counter(alert['AlertType'] for alert in alerts)
+
+
+@app.cli.command('scan-alerts')
+def scan_alerts_command():
+    """Find expiring licenses and insurance and due or overdue rentals."""
+    counts = scan_expiry_alerts()
+    click.echo(', '.join(f'{counts[alert_type]} {alert_type}' for alert_type in ('tdl', 'insurance', 'return')))
+
+
+alert_scanner_started = False
+alert_scanner_lock = threading.Lock()
+
+
+def run_alert_scanner(interval):
+    while True:
+        try:
+            with app.app_context():
+                scan_expiry_alerts()
+        except Exception:
+            app.logger.exception('Expiry alert scan failed')
+        time.sleep(interval)
+
+
+@app.before_request
+def start_alert_scanner():
+    # Started by the first request rather than at import, so CLI commands don't run it.
+    # Every worker runs its own, the scan is idempotent and cheap.
+    global alert_scanner_started
+    interval = app.config['ALERT_SCAN_INTERVAL_SECONDS']
+    if not interval or alert_scanner_started:
+        return
+    with alert_scanner_lock:
+        if not alert_scanner_started:
+            threading.Thread(target=run_alert_scanner, args=(interval,), name='alert-scanner', daemon=True).start()
+            alert_scanner_started = True
+
+
+ALERT_STATES = {'tdl': ('expiring', 'expired'), 'insurance': ('expiring', 'expired'), 'return': ('due', 'overdue')}
+
+
+@app.route('/alerts', methods=['GET'])
+def alerts():
+    """The last scan's alerts, soonest first, optionally ?type=tdl|insurance|return and ?state=..."""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    alert_type, state = request.args.get('type'), request.args.get('state')
+    if alert_type and alert_type not in ALERT_STATES:
+        return jsonify({'error': 'type must be one of ' + ', '.join(ALERT_STATES)}), 400
+    if state and state not in {name for states in ALERT_STATES.values() for name in states}:
+        return jsonify({'error': 'Unknown state'}), 400
+
+    def build():
+        query = select(
+            ExpiryAlerts.AlertType, ExpiryAlerts.AlertState, ExpiryAlerts.DueDate, ExpiryAlerts.ScannedAt,
+            ExpiryAlerts.CustomerID, ExpiryAlerts.RentalID, Customers.FirstName, Customers.LastName, Customers.Phone,
+        ).join(Customers, Customers.CustomerID == ExpiryAlerts.CustomerID).order_by(ExpiryAlerts.DueDate, ExpiryAlerts.AlertID)
+        if alert_type:
+            query = query.where(ExpiryAlerts.AlertType == alert_type)
+        if state:
+            query = query.where(ExpiryAlerts.AlertState == state)
+        rows = db.session.execute(query).all()
+        return jsonify(dict(columnar(query, rows), scanned_at=rows[0].ScannedAt.isoformat(timespec='seconds') if rows else None))
+
+    return conditional_response('alerts:' + request.query_string.decode(), ('expiry_alerts', 'customers'), build)
+
+##############################################################################################################################################################################################################################
+#                                                                            ALERTS                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+JOB_FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobError(Exception):
+    """Raised by a job handler for a failure that retrying won't fix."""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+JobHandler = collections.namedtuple('JobHandler', 'function concurrency max_attempts')
+job_handlers = {}
+
+
+def job_handler(kind, concurrency=1, max_attempts=3):
+    """Register ``function(payload, job)`` to run the jobs of ``kind``.
+
+    At most ``concurrency`` of them run at once across every worker sharing the
+    database. The function returns a JSON-able value or ``(body, mimetype)``.
+    """
+    def register(function):
+        job_handlers[kind] = JobHandler(function, concurrency, max_attempts)
+        return function
+    return register
+
+
+class RunningJob:
+    """What a handler gets to know about the job it is running."""
+
+    def __init__(self, job_id, agent_id):
+        self.job_id = job_id
+        self.agent_id = agent_id
+
+    def check_cancelled(self):
+        """Raise JobCancelled if someone asked to cancel this job, for long handlers to call between batches.
+
+        It reads on a connection of its own: the handler's transaction may have
+        started before the cancel was committed and wouldn't see it.
+        """
+        with db.engine.connect() as connection:
+            if connection.execute(select(Jobs.CancelRequested).where(Jobs.JobID == self.job_id)).scalar():
+                raise JobCancelled()
+
+
+# Wakes this process's workers as soon as a job is submitted instead of at the next poll
+job_submitted = threading.Condition()
+
+
+def submit_job(kind, payload, agent_id):
+    """Queue a job and return its JobID, committing the current session."""
+    now = utc_now()
+    job = Jobs(Kind=kind, Payload=json.dumps(payload), Status='queued', Attempts=0, CancelRequested=False,
+               MaxAttempts=job_handlers[kind].max_attempts, SubmittedByAgentID=agent_id, CreatedAt=now, RunAfter=now)
+    db.session.add(job)
+    db.session.flush()
+    job_id = job.JobID
+    db.session.commit()
+    start_job_workers()
+    with job_submitted:
+        job_submitted.notify()
+    return job_id
+
+
+def job_accepted(job_id):
+    response = jsonify({'job_id': job_id, 'status': 'queued', 'status_url': url_for('job_status', job_id=job_id),
+                        'result_url': url_for('job_result', job_id=job_id)})
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job_id)
+    return response
+
+
+def requeue_stale_jobs():
+    """Hand the jobs of workers that stopped heartbeating to another worker.
+
+    A worker that died mid-job would leave it running forever. The lost run
+    was counted as an attempt when it was claimed, so a job that kills its
+    worker every time fails once it is out of attempts instead of looping.
+    """
+    now = utc_now()
+    cutoff = now - datetime.timedelta(seconds=app.config['JOB_TIMEOUT_SECONDS'])
+    stale = and_(Jobs.Status == 'running', func.coalesce(Jobs.HeartbeatAt, Jobs.StartedAt) < cutoff)
+    db.session.execute(
+        update(Jobs).where(stale, Jobs.Attempts >= Jobs.MaxAttempts)
+        .values(Status='failed', LockedBy=None, FinishedAt=now, Error='The worker running it stopped')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(Jobs).where(stale, Jobs.Attempts < Jobs.MaxAttempts)
+        .values(Status='queued', LockedBy=None, RunAfter=now).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+@contextlib.contextmanager
+def job_heartbeat(job_id, worker_name):
+    """Touch the job every JOB_HEARTBEAT_SECONDS while the block runs, so it isn't taken for stale."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(app.config['JOB_HEARTBEAT_SECONDS']):
+            try:
+                # Its own transaction, the handler's may stay open for the whole job
+                with app.app_context(), db.engine.begin() as connection:
+                    connection.execute(
+                        update(Jobs).where(Jobs.JobID == job_id, Jobs.Status == 'running', Jobs.LockedBy == worker_name)
+                        .values(HeartbeatAt=utc_now())
+                    )
+            except Exception:
+                app.logger.warning('Heartbeat of job %s failed', job_id, exc_info=True)
+
+    thread = threading.Thread(target=beat, name=f'job-heartbeat-{job_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def claim_next_job(worker_name):
+    """Mark the oldest runnable job as running by ``worker_name`` and return its JobID, or None.
+
+    The claim is a conditional UPDATE like claim_equipment(), so two workers never
+    run the same job. The per-kind concurrency count can be off by one when two
+    workers claim at the same moment.
+    """
+    now = utc_now()
+    candidates = db.session.execute(
+        select(Jobs.JobID, Jobs.Kind).where(Jobs.Status == 'queued', Jobs.RunAfter <= now).order_by(Jobs.RunAfter, Jobs.JobID).limit(20)
+    ).all()
+    if not candidates:
+        db.session.rollback()
+        return None
+    running = dict(db.session.execute(
+        select(Jobs.Kind, func.count()).where(Jobs.Status == 'running').group_by(Jobs.Kind)
+    ).all())
+
+    for job_id, kind in candidates:
+        handler = job_handlers.get(kind)
+        # Kinds this code doesn't know are left to a worker that does
+        if handler is None or running.get(kind, 0) >= handler.concurrency:
+            continue
+        claimed = db.session.execute(
+            update(Jobs).where(Jobs.JobID == job_id, Jobs.Status == 'queued')
+            .values(Status='running', Attempts=Jobs.Attempts + 1, StartedAt=now, HeartbeatAt=now, LockedBy=worker_name)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+    db.session.rollback()
+    return None
+
+
+def finish_job(job_id, worker_name, **values):
+    # Only while still ours, a job requeued as stale meanwhile belongs to another worker now
+    db.session.execute(
+        update(Jobs).where(Jobs.JobID == job_id, Jobs.Status == 'running', Jobs.LockedBy == worker_name)
+        .values(FinishedAt=utc_now(), **values).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_job(job_id, worker_name):
+    job = db.session.get(Jobs, job_id)
+    handler = job_handlers[job.Kind]
+    attempts, max_attempts, payload, agent_id = job.Attempts, job.MaxAttempts, json.loads(job.Payload), job.SubmittedByAgentID
+    if job.CancelRequested:
+        finish_job(job_id, worker_name, Status='cancelled')
+        return
+    db.session.rollback()
+
+    try:
+        with job_heartbeat(job_id, worker_name):
+            result = handler.function(payload, RunningJob(job_id, agent_id))
+    except JobCancelled:
+        db.session.rollback()
+        finish_job(job_id, worker_name, Status='cancelled')
+        return
+    except Exception as e:
+        db.session.rollback()
+        app.logger.warning('Job %s (%s) attempt %s failed: %s', job_id, handler.function.__name__, attempts, e)
+        if isinstance(e, JobError) or attempts >= max_attempts:
+            finish_job(job_id, worker_name, Status='failed', Error=str(e))
+        else:
+            retry_at = utc_now() + datetime.timedelta(seconds=app.config['JOB_RETRY_SECONDS'] * 2 ** (attempts - 1))
+            db.session.execute(
+                update(Jobs).where(Jobs.JobID == job_id, Jobs.Status == 'running', Jobs.LockedBy == worker_name)
+                .values(Status='queued', LockedBy=None, RunAfter=retry_at, Error=str(e))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        return
+
+    body, mimetype = result if isinstance(result, tuple) else (json.dumps(result), 'application/json')
+    finish_job(job_id, worker_name, Status='succeeded', Result=body, ResultMimetype=mimetype, Error=None)
+
+
+def job_worker_loop(worker_name, stop=None):
+    """Run jobs until ``stop`` is set, sleeping on job_submitted between them."""
+    last_stale_check = 0
+    while stop is None or not stop.is_set():
+        job_id = None
+        try:
+            # A request context so handlers can render templates and build URLs
+            with app.test_request_context():
+                if time.monotonic() - last_stale_check > app.config['JOB_POLL_SECONDS'] * 30:
+                    requeue_stale_jobs()
+                    last_stale_check = time.monotonic()
+                job_id = claim_next_job(worker_name)
+                if job_id is not None:
+                    run_job(job_id, worker_name)
+        except Exception:
+            app.logger.exception('Job worker %s failed on job %s', worker_name, job_id)
+        if job_id is None:
+            with job_submitted:
+                job_submitted.wait(app.config['JOB_POLL_SECONDS'])
+
+
+job_workers_started = False
+job_workers_lock = threading.Lock()
+
+
+def start_job_workers():
+    global job_workers_started
+    if not app.config['JOB_WORKERS'] or job_workers_started:
+        return
+    with job_workers_lock:
+        if job_workers_started:
+            return
+        for number in range(app.config['JOB_WORKERS']):
+            name = f'{platform.node()}:{os.getpid()}:{number}'
+            threading.Thread(target=job_worker_loop, args=(name,), name=f'job-worker-{number}', daemon=True).start()
+        job_workers_started = True
+
+
+@app.before_request
+def start_job_workers_on_first_request():
+    # Not at import, so CLI commands and `flask run-jobs` don't start a second set
+    start_job_workers()
+
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=2, show_default=True, help='Jobs run at the same time by this process.')
+def run_jobs_command(workers):
+    """Run queued jobs until interrupted.
+
+    This is how jobs run by default (JOB_WORKERS=0): one or more of these next to
+    the web processes, e.g. `flask run-jobs --workers 4` under the process manager.
+    """
+    stop = threading.Event()
+    threads = [threading.Thread(target=job_worker_loop, args=(f'{platform.node()}:{os.getpid()}:{number}', stop), daemon=True)
+               for number in range(workers)]
+    for thread in threads:
+        thread.start()
+    click.echo(f'Running jobs with {workers} workers, Ctrl+C to stop')
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        with job_submitted:
+            job_submitted.notify_all()
+        for thread in threads:
+            thread.join()
+
+
+def job_to_dict(job):
+    data = {
+        'job_id': job.JobID,
+        'kind': job.Kind,
+        'status': job.Status,
+        'attempts': job.Attempts,
+        'max_attempts': job.MaxAttempts,
+        'cancel_requested': job.CancelRequested,
+        'error': job.Error,
+    }
+    for key, column in (('created_at', job.CreatedAt), ('started_at', job.StartedAt), ('finished_at', job.FinishedAt)):
+        data[key] = column.isoformat(timespec='seconds') + 'Z' if column else None
+    if job.Status == 'succeeded':
+        data['result_url'] = url_for('job_result', job_id=job.JobID)
+    return data
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job_route():
+    """Queue ``{"kind": ..., "payload": {...}}`` and answer 202 with where to follow it."""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    data = request.get_json(silent=True) or {}
+    if data.get('kind') not in job_handlers:
+        return jsonify({'error': 'kind must be one of ' + ', '.join(sorted(job_handlers))}), 400
+    if not isinstance(data.get('payload', {}), dict):
+        return jsonify({'error': 'payload must be a JSON object'}), 400
+    return job_accepted(submit_job(data['kind'], data.get('payload', {}), current_user.AgentID))
+
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = db.session.get(Jobs, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+
+@app.route('/jobs/<int:job_id>/result', methods=['GET'])
+def job_result(job_id):
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    job = db.session.get(Jobs, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.Status != 'succeeded':
+        return jsonify(dict(job_to_dict(job), error=job.Error or 'The job has no result yet')), 409
+    return Response(job.Result, mimetype=job.ResultMimetype)
+
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job at once, a running one when its handler next checks."""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    cancelled = db.session.execute(
+        update(Jobs).where(Jobs.JobID == job_id, Jobs.Status == 'queued')
+        .values(Status='cancelled', CancelRequested=True, FinishedAt=utc_now())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not cancelled:
+        db.session.execute(
+            update(Jobs).where(Jobs.JobID == job_id, Jobs.Status == 'running')
+            .values(CancelRequested=True).execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+    job = db.session.get(Jobs, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+
+@job_handler('printed_page', concurrency=4)
+def printed_page_job(payload, job):
+    html = render_printed_page(int(payload['customer_id']))
+    if html is None:
+        raise JobError('Customer not found')
+    return html, 'text/html'
+
+
+# Agreements a printed_pages job renders between checks for a cancel
+PRINT_JOB_CANCEL_CHECK_EVERY = 100
+
+
+@job_handler('printed_pages', concurrency=2)
+def printed_pages_job(payload, job):
+    try:
+        customer_ids, rental_filter = printed_batch(payload)
+    except ValueError as e:
+        raise JobError(str(e))
+
+    def agreements():
+        for number, agreement in enumerate(printed_batch_agreements(customer_ids, rental_filter)):
+            if number % PRINT_JOB_CANCEL_CHECK_EVERY == 0:
+                job.check_cancelled()
+            yield agreement
+
+    return render_template('printedPages.html', agreements=agreements()), 'text/html'
+
+
+# One at a time, so two cascades never fight over the same rentals' locks
+@job_handler('change_status', concurrency=1)
+def change_status_job(payload, job):
+    if payload.get('status') not in CUSTOMER_STATUS_IDS:
+        raise JobError('Invalid status')
+    results = dict.fromkeys(payload.get('invalid', []), 'invalid')
+    # Committed once at the end, so a cancelled job leaves every customer as it was
+    for chunk in chunked([int(customer_id) for customer_id in payload['customer_ids']], BULK_CHUNK_SIZE):
+        job.check_cancelled()
+        results.update(change_customer_statuses(chunk, payload['status'], job.agent_id))
+    db.session.commit()
+    return bulk_status_report(results)
+
+##############################################################################################################################################################################################################################
+#                                                                            JOBS                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+# Longest range one /calendar request may cover
+CALENDAR_MAX_DAYS = 93
+
+
+def booked_over(start, end):
+    """SELECT of the open rentals that overlap ``start``..``end`` (both inclusive, None is unbounded).
+
+    Add a Rentals.EquipmentID condition to ask about one unit. A rental without a
+    RentalDate is taken to have always been out and one without a ReturnDate
+    never to come back; an overdue one holds its unit until today.
+    """
+    query = select(Rentals.RentalID).where(Rentals.StatusID.in_(OPEN_RENTAL_STATUS_IDS))
+    if end is not None:
+        query = query.where(or_(Rentals.RentalDate <= end, Rentals.RentalDate.is_(None)))
+    if start is not None and start > datetime.date.today():
+        query = query.where(or_(Rentals.ReturnDate >= start, Rentals.ReturnDate.is_(None)))
+    return query
+
+
+class BookingCalendar:
+    """The days every equipment unit is booked, kept in this process.
+
+    Each unit keeps its open rentals as day ranges sorted by start, with the
+    running maximum of their ends, so "is this unit free from A to B" is one
+    binary search however many rentals it has. Like AvailabilityIndex, commits
+    mark the rentals and units they changed (see ``track_bookings``) and the
+    next read looks up only those, and every ``reconcile_seconds`` and at
+    midnight it is rebuilt whole. Booking re-checks the database, so a calendar
+    that is behind another worker costs a failed attempt, never a double booking.
+    """
+
+    OPEN_START = datetime.date.min.toordinal()
+    OPEN_END = datetime.date.max.toordinal()
+
+    def __init__(self, reconcile_seconds):
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        self._units = {}  # EquipmentType -> sorted EquipmentIDs
+        self._types = {}  # EquipmentID -> EquipmentType
+        self._rentals = {}  # RentalID -> (EquipmentID, first day, last day) as ordinals
+        self._unit_rentals = collections.defaultdict(set)  # EquipmentID -> RentalIDs
+        self._booked = {}  # EquipmentID -> (starts, running max of ends, ends), sorted by start
+        self._stale_rentals = set()
+        self._stale_units = set()
+        self._loaded_at = None
+        self._loaded_day = None
+
+    def invalidate(self, rental_ids=(), equipment_ids=(), everything=False):
+        with self._lock:
+            if everything:
+                self._loaded_at = None
+            self._stale_rentals.update(rental_ids)
+            self._stale_units.update(equipment_ids)
+
+    def free_units(self, equipment_type, start, end):
+        """EquipmentIDs of ``equipment_type`` with nothing booked from ``start`` to ``end``, lowest first."""
+        first, last = self._days(start, end)
+        with self._lock:
+            self._refresh()
+            return [equipment_id for equipment_id in self._units.get(equipment_type, ())
+                    if self._is_free(equipment_id, first, last)]
+
+    def month(self, start, end, equipment_types=None):
+        """Free units per type for every day from ``start`` to ``end``.
+
+        Returns ``{EquipmentType: {'units': n, 'free': [count per day], 'free_units': [ids free all along]}}``.
+        """
+        first, last = self._days(start, end)
+        days = last - first + 1
+        calendar = {}
+        with self._lock:
+            self._refresh()
+            for equipment_type in sorted(equipment_types or self._units):
+                units = self._units.get(equipment_type, [])
+                # +1 where a unit's busy stretch begins, -1 the day after it ends
+                changes = [0] * (days + 1)
+                free_units = []
+                for equipment_id in units:
+                    busy = self._busy_ranges(equipment_id, first, last)
+                    if not busy:
+                        free_units.append(equipment_id)
+                    for busy_first, busy_last in busy:
+                        changes[busy_first - first] += 1
+                        changes[busy_last - first + 1] -= 1
+                free, booked = [], 0
+                for day in range(days):
+                    booked += changes[day]
+                    free.append(len(units) - booked)
+                calendar[equipment_type] = {'units': len(units), 'free': free, 'free_units': free_units}
+        return calendar
+
+    def _days(self, start, end):
+        return (start.toordinal() if start is not None else self.OPEN_START,
+                end.toordinal() if end is not None else self.OPEN_END)
+
+    def _is_free(self, equipment_id, first, last):
+        booked = self._booked.get(equipment_id)
+        if booked is None:
+            return True
+        starts, max_ends, _ = booked
+        # The rentals starting by ``last`` all end before ``first`` exactly when the latest of them does
+        position = bisect.bisect_right(starts, last) - 1
+        return position < 0 or max_ends[position] < first
+
+    def _busy_ranges(self, equipment_id, first, last):
+        """The unit's booked stretches clipped to ``first``..``last``, merged, in order."""
+        booked = self._booked.get(equipment_id)
+        if booked is None:
+            return []
+        starts, _, ends = booked
+        merged = []
+        for position in range(bisect.bisect_right(starts, last)):
+            if ends[position] < first:
+                continue
+            busy_first, busy_last = max(starts[position], first), min(ends[position], last)
+            if merged and busy_first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], busy_last)
+            else:
+                merged.append([busy_first, busy_last])
+        return merged
+
+    def _span(self, row, today):
+        first = row.RentalDate.toordinal() if row.RentalDate is not None else self.OPEN_START
+        last = row.ReturnDate.toordinal() if row.ReturnDate is not None else self.OPEN_END
+        # An overdue rental keeps its unit until it is completed
+        if first <= today:
+            last = max(last, today)
+        return row.EquipmentID, first, last
+
+    def _add_rental(self, rental_id, span):
+        self._rentals[rental_id] = span
+        self._unit_rentals[span[0]].add(rental_id)
+
+    def _remove_rental(self, rental_id):
+        span = self._rentals.pop(rental_id, None)
+        if span is not None:
+            self._unit_rentals[span[0]].discard(rental_id)
+        return span
+
+    def _rebuild_units(self, equipment_ids):
+        for equipment_id in equipment_ids:
+            unit_spans = sorted(self._rentals[rental_id][1:] for rental_id in self._unit_rentals.get(equipment_id, ()))
+            if not unit_spans:
+                self._booked.pop(equipment_id, None)
+                self._unit_rentals.pop(equipment_id, None)
+                continue
+            starts = [first for first, _ in unit_spans]
+            ends = [last for _, last in unit_spans]
+            self._booked[equipment_id] = (starts, list(itertools.accumulate(ends, max)), ends)
+
+    def _set_unit(self, equipment_id, equipment_type):
+        old_type = self._types.pop(equipment_id, None)
+        if old_type is not None:
+            units = self._units[old_type]
+            del units[bisect.bisect_left(units, equipment_id)]
+            if not units:
+                del self._units[old_type]
+        if equipment_type is not None:
+            bisect.insort(self._units.setdefault(equipment_type, []), equipment_id)
+            self._types[equipment_id] = equipment_type
+
+    def _refresh(self):
+        today = datetime.date.today().toordinal()
+        if (self._loaded_at is None or today != self._loaded_day
+                or time.monotonic() - self._loaded_at > self.reconcile_seconds):
+            # The fleet is read whole on purpose, explain-check knows to let it be
+            units = db.session.execute(
+                select(Equipment.EquipmentID, Equipment.EquipmentType).execution_options(full_scan_ok=True)
+            ).all()
+            rentals = db.session.execute(
+                select(Rentals.RentalID, Rentals.EquipmentID, Rentals.RentalDate, Rentals.ReturnDate)
+                .where(Rentals.StatusID.in_(OPEN_RENTAL_STATUS_IDS), Rentals.EquipmentID.isnot(None))
+            ).all()
+            self._units, self._types = {}, {}
+            for row in sorted(units):
+                self._set_unit(row.EquipmentID, row.EquipmentType)
+            self._rentals, self._unit_rentals, self._booked = {}, collections.defaultdict(set), {}
+            for row in rentals:
+                self._add_rental(row.RentalID, self._span(row, today))
+            self._rebuild_units(list(self._unit_rentals))
+            self._stale_rentals, self._stale_units = set(), set()
+            self._loaded_at, self._loaded_day = time.monotonic(), today
+            return
+
+        stale_rentals, self._stale_rentals = self._stale_rentals, set()
+        stale_units, self._stale_units = self._stale_units, set()
+        touched = set()
+        for chunk in chunked(sorted(stale_rentals), BULK_CHUNK_SIZE):
+            rows = db.session.execute(
+                select(Rentals.RentalID, Rentals.EquipmentID, Rentals.RentalDate, Rentals.ReturnDate, Rentals.StatusID)
+                .where(Rentals.RentalID.in_(chunk))
+            ).all()
+            for rental_id in chunk:
+                old = self._remove_rental(rental_id)
+                if old is not None:
+                    touched.add(old[0])
+            for row in rows:
+                if row.StatusID in OPEN_RENTAL_STATUS_IDS and row.EquipmentID is not None:
+                    self._add_rental(row.RentalID, self._span(row, today))
+                    touched.add(row.EquipmentID)
+        for chunk in chunked(sorted(stale_units), BULK_CHUNK_SIZE):
+            types = dict(db.session.execute(
+                select(Equipment.EquipmentID, Equipment.EquipmentType).where(Equipment.EquipmentID.in_(chunk))
+            ).all())
+            for equipment_id in chunk:
+                if types.get(equipment_id) != self._types.get(equipment_id):
+                    self._set_unit(equipment_id, types.get(equipment_id))
+        if touched:
+            self._rebuild_units(touched)
+
+
+booking_calendar = BookingCalendar(app.config['AVAILABILITY_RECONCILE_SECONDS'])
+
+
+@on_rows_changed
+def track_bookings(rows):
+    if rows.get('rentals', ()) is None or rows.get('equipment', ()) is None:
+        booking_calendar.invalidate(everything=True)
+    else:
+        booking_calendar.invalidate(rows.get('rentals', ()), rows.get('equipment', ()))
+
+
+@app.route('/calendar', methods=['GET'])
+def calendar():
+    """Free units per equipment type for every day of a range.
+
+    ?start=YYYY-MM-DD (default today) and ?end=YYYY-MM-DD or ?days=N (default a
+    week), optionally ?type=Mixer. ``free_units`` lists the units free on every
+    day of the range, so ?start=2026-10-20&days=1 answers what's free that day.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    today = datetime.date.today()
+    try:
+        start = datetime.date.fromisoformat(request.args['start']) if request.args.get('start') else today
+        if request.args.get('end'):
+            end = datetime.date.fromisoformat(request.args['end'])
+        else:
+            end = start + datetime.timedelta(days=int(request.args.get('days', 7)) - 1)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates and days a number'}), 400
+    if end < start:
+        return jsonify({'error': 'end is before start'}), 400
+    if (end - start).days + 1 > CALENDAR_MAX_DAYS:
+        return jsonify({'error': f'At most {CALENDAR_MAX_DAYS} days at a time'}), 400
+    equipment_type = request.args.get('type')
+
+    def build():
+        month = booking_calendar.month(start, end, [equipment_type] if equipment_type else None)
+        return jsonify({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'days': [(start + datetime.timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)],
+            'types': [dict(EquipmentType=name, **day_counts) for name, day_counts in month.items()],
+        })
+
+    # Overdue rentals stretch to today, so the answer also changes overnight
+    return conditional_response(f'calendar:{today}:{request.query_string.decode()}', ('rentals', 'equipment'), build)
+
+##############################################################################################################################################################################################################################
+#                                                                            CALENDAR                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+AUDITED_ENTITIES = ('customers', 'equipment', 'rentals', 'vehicles')
+AUDIT_PAGE_SIZE = 100
+
+
+def audit_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def audit_change(entity, entity_id, action, agent_id, old, new):
+    """Log the fields of ``new`` that differ from ``old`` once the current transaction commits.
+
+    ``old`` None means the old values weren't read: every field is logged, with no OldValue.
+    """
+    now = utc_now()
+    pending = db.session.info.setdefault('audit', [])
+    for field, value in new.items():
+        old_value, new_value = audit_value(old.get(field)) if old is not None else None, audit_value(value)
+        if old is None or old_value != new_value:
+            pending.append({'EntityType': entity, 'EntityID': entity_id, 'Action': action, 'Field': field,
+                            'OldValue': old_value, 'NewValue': new_value, 'AgentID': agent_id, 'ChangedAt': now})
+
+
+def audit_created(obj, agent_id):
+    """Log a flushed new row with all its columns once the current transaction commits."""
+    mapper = obj.__mapper__
+    values = {column.key: audit_value(getattr(obj, column.key)) for column in mapper.columns}
+    db.session.info.setdefault('audit', []).append({
+        'EntityType': obj.__table__.name, 'EntityID': mapper.primary_key_from_instance(obj)[0], 'Action': 'create',
+        'Field': None, 'OldValue': None, 'NewValue': json.dumps(values), 'AgentID': agent_id, 'ChangedAt': utc_now(),
+    })
+
+
+class AuditLog:
+    """Change log entries waiting to be written to change_log.
+
+    Requests only append to a list; a background thread writes the entries in
+    batches once ``flush_size`` are waiting or ``flush_seconds`` have passed,
+    and whatever is left is written when the process exits. Entries stay queued
+    while the database is unreachable, up to ``max_entries``.
+    """
+
+    def __init__(self, flush_size, flush_seconds, max_entries):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_entries = max_entries
+        self._entries = []
+        self._ready = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._started = False
+
+    def add(self, entries):
+        with self._ready:
+            self._entries.extend(entries)
+            dropped = len(self._entries) - self.max_entries
+            if dropped > 0:
+                del self._entries[:dropped]
+                app.logger.error('Change log buffer is full, dropped %s entries', dropped)
+            if len(self._entries) >= self.flush_size:
+                self._ready.notify()
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._run, name='audit-log', daemon=True).start()
+
+    def flush(self):
+        """Write every queued entry now, return how many were written."""
+        with self._flush_lock:
+            with self._ready:
+                entries, self._entries = self._entries, []
+            if not entries:
+                return 0
+            try:
+                with app.app_context(), db.engine.begin() as connection:
+                    for batch in chunked(entries, self.flush_size):
+                        connection.execute(insert(ChangeLog), batch)
+            except Exception:
+                app.logger.exception('Could not write %s change log entries, will retry', len(entries))
+                with self._ready:
+                    self._entries[:0] = entries
+                return 0
+            return len(entries)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                self._ready.wait_for(lambda: len(self._entries) >= self.flush_size, timeout=self.flush_seconds)
+            self.flush()
+
+
+audit_log = AuditLog(app.config['AUDIT_FLUSH_SIZE'], app.config['AUDIT_FLUSH_SECONDS'], app.config['AUDIT_BUFFER_MAX'])
+atexit.register(audit_log.flush)
+
+
+@event.listens_for(db.session, 'after_commit')
+def queue_audit_entries(session):
+    entries = session.info.pop('audit', None)
+    if entries:
+        audit_log.add(entries)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_audit_entries(session):
+    session.info.pop('audit', None)
+
+
+@app.route('/audit/<entity>/<int:entity_id>', methods=['GET'])
+def audit_trail(entity, entity_id):
+    """The change log of one row, newest first, AUDIT_PAGE_SIZE at a time; ?before=<change_id> pages back."""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if entity not in AUDITED_ENTITIES:
+        return jsonify({'error': 'entity must be one of ' + ', '.join(AUDITED_ENTITIES)}), 404
+    try:
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'before must be a change id'}), 400
+
+    # This worker's own recent changes show up at once
+    audit_log.flush()
+
+    query = select(ChangeLog).where(ChangeLog.EntityType == entity, ChangeLog.EntityID == entity_id)
+    if before is not None:
+        query = query.where(ChangeLog.ChangeID < before)
+    changes = db.session.execute(query.order_by(ChangeLog.ChangeID.desc()).limit(AUDIT_PAGE_SIZE + 1)).scalars().all()
+    next_before = changes[AUDIT_PAGE_SIZE - 1].ChangeID if len(changes) > AUDIT_PAGE_SIZE else None
+
+    return jsonify({
+        'changes': [{
+            'change_id': change.ChangeID,
+            'action': change.Action,
+            'field': change.Field,
+            'old': change.OldValue,
+            'new': json.loads(change.NewValue) if change.Field is None and change.NewValue else change.NewValue,
+            'agent_id': change.AgentID,
+            'changed_at': change.ChangedAt.isoformat(timespec='seconds') + 'Z',
+        } for change in changes[:AUDIT_PAGE_SIZE]],
+        'next_before': next_before,
+    })
+
+##############################################################################################################################################################################################################################
+#                                                                            AUDIT                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+
+NOTE_SEARCH_MAX_TERMS = 10
+NOTE_SEARCH_PAGE_SIZE = 20
+NOTE_SEARCH_MAX_PAGE_SIZE = 50
+NOTE_SNIPPET_CHARS = 120
+# The note columns /search/notes looks in, per entity
+NOTE_FIELDS = {
+    'customers': ('CustomerNote', 'LeaseAgreement'),
+    'rentals': ('InternalNote',),
+}
+
+
+def sqlite_has_fts5():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+class NoteSearchIndex:
+    """The SQLite stand-in for MySQL's FULLTEXT indexes on the note columns.
+
+    ``note_search`` is an FTS5 table with one row per customer (rowid
+    CustomerID * 2) and per rental (RentalID * 2 + 1). Triggers on customers
+    and rentals copy a row's notes into it whenever a write sets them, in the
+    same transaction, so it is as current as the tables for every worker and
+    writes that leave the notes alone cost nothing. The table and its triggers
+    come with the migration, or are created and filled on first use when missing.
+    """
+
+    TABLE = 'note_search'
+    SCHEMA = (
+        'CREATE VIRTUAL TABLE note_search USING fts5(note, lease)',
+        # Deleting a rowid that isn't there is a no-op, so every trigger can start by clearing the row
+        """CREATE TRIGGER note_search_customers_insert AFTER INSERT ON customers BEGIN
+            INSERT INTO note_search (rowid, note, lease) SELECT new."CustomerID" * 2, new."CustomerNote", new."LeaseAgreement"
+            WHERE new."CustomerNote" IS NOT NULL OR new."LeaseAgreement" IS NOT NULL; END""",
+        """CREATE TRIGGER note_search_customers_update AFTER UPDATE OF "CustomerNote", "LeaseAgreement" ON customers BEGIN
+            DELETE FROM note_search WHERE rowid = old."CustomerID" * 2;
+            INSERT INTO note_search (rowid, note, lease) SELECT new."CustomerID" * 2, new."CustomerNote", new."LeaseAgreement"
+            WHERE new."CustomerNote" IS NOT NULL OR new."LeaseAgreement" IS NOT NULL; END""",
+        """CREATE TRIGGER note_search_customers_delete AFTER DELETE ON customers BEGIN
+            DELETE FROM note_search WHERE rowid = old."CustomerID" * 2; END""",
+        """CREATE TRIGGER note_search_rentals_insert AFTER INSERT ON rentals BEGIN
+            INSERT INTO note_search (rowid, note) SELECT new."RentalID" * 2 + 1, new."InternalNote"
+            WHERE new."InternalNote" IS NOT NULL; END""",
+        """CREATE TRIGGER note_search_rentals_update AFTER UPDATE OF "InternalNote" ON rentals BEGIN
+            DELETE FROM note_search WHERE rowid = old."RentalID" * 2 + 1;
+            INSERT INTO note_search (rowid, note) SELECT new."RentalID" * 2 + 1, new."InternalNote"
+            WHERE new."InternalNote" IS NOT NULL; END""",
+        """CREATE TRIGGER note_search_rentals_delete AFTER DELETE ON rentals BEGIN
+            DELETE FROM note_search WHERE rowid = old."RentalID" * 2 + 1; END""",
+        """INSERT INTO note_search (rowid, note, lease) SELECT "CustomerID" * 2, "CustomerNote", "LeaseAgreement" FROM customers
+            WHERE "CustomerNote" IS NOT NULL OR "LeaseAgreement" IS NOT NULL""",
+        """INSERT INTO note_search (rowid, note) SELECT "RentalID" * 2 + 1, "InternalNote" FROM rentals
+            WHERE "InternalNote" IS NOT NULL""",
+    )
+
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        """Create and fill the table and its triggers unless this database already has them."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            exists = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name").execution_options(full_scan_ok=True),
+                {'name': self.TABLE},
+            ).first()
+            if not exists:
+                for statement in self.SCHEMA:
+                    db.session.execute(text(statement))
+                db.session.commit()
+            self._ready = True
+
+
+NOTE_SEARCH_FTS5 = sqlite_has_fts5()
+note_search_index = NoteSearchIndex()
+
+
+def note_search_backend():
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        return 'mysql'
+    if dialect == 'sqlite' and NOTE_SEARCH_FTS5:
+        return 'fts5'
+    return 'like'
+
+
+def search_terms(query):
+    """Words and "quoted phrases" of a search box entry, without the punctuation full-text syntax uses."""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query or ''):
+        term = ' '.join(re.findall(r'\w+', phrase or word))
+        if term and term.lower() not in {t.lower() for t in terms}:
+            terms.append(term)
+    return terms[:NOTE_SEARCH_MAX_TERMS]
+
+
+def note_snippet(note, terms):
+    """Up to NOTE_SNIPPET_CHARS of ``note`` around its first match with every match in <mark>, None if none."""
+    if not note:
+        return None
+    pattern = re.compile('|'.join(r'\b' + r'\W+'.join(map(re.escape, term.split())) for term in terms), re.IGNORECASE)
+    first = pattern.search(note)
+    if first is None:
+        return None
+    start = max(0, first.start() - NOTE_SNIPPET_CHARS // 3)
+    end = min(len(note), start + NOTE_SNIPPET_CHARS)
+    window = note[start:end]
+    snippet = Markup('\u2026' if start else '')
+    position = 0
+    for match in pattern.finditer(window):
+        snippet += window[position:match.start()] + Markup('<mark>%s</mark>') % match.group()
+        position = match.end()
+    snippet += window[position:] + Markup('\u2026' if end < len(note) else '')
+    return str(snippet)
+
+
+def ranked_note_matches(terms, entities, limit, offset):
+    """``[(entity, id, score)]`` best match first, for one page of /search/notes."""
+    backend = note_search_backend()
+    if backend == 'fts5':
+        note_search_index.ensure()
+        expression = ' '.join('"' + term + '"' for term in terms)
+        parities = ', '.join(str(list(NOTE_FIELDS).index(entity)) for entity in entities)
+        rows = db.session.execute(text(
+            f'SELECT rowid, bm25({NoteSearchIndex.TABLE}) AS rank FROM {NoteSearchIndex.TABLE} '
+            f'WHERE {NoteSearchIndex.TABLE} MATCH :expression AND rowid % 2 IN ({parities}) '
+            'ORDER BY rank, rowid DESC LIMIT :limit OFFSET :offset'
+        ), {'expression': expression, 'limit': limit, 'offset': offset}).all()
+        # bm25() is lower for better matches, flip it so every backend ranks high to low
+        return [(list(NOTE_FIELDS)[row.rowid % 2], row.rowid // 2, -row.rank) for row in rows]
+
+    models = {'customers': (Customers, Customers.CustomerID), 'rentals': (Rentals, Rentals.RentalID)}
+    queries = []
+    for entity in entities:
+        model, key = models[entity]
+        columns = [getattr(model, field) for field in NOTE_FIELDS[entity]]
+        if backend == 'mysql':
+            score = mysql_match(*columns, against=' '.join('+"' + term + '"' for term in terms)).in_boolean_mode()
+            condition = score > 0
+        else:
+            # No full-text index to use, only for local checks without FTS5
+            score = literal(0.0)
+            condition = and_(*(or_(*(column.ilike(f'%{term}%') for column in columns)) for term in terms))
+        queries.append(select(literal(entity).label('entity'), key.label('id'), score.label('score')).where(condition))
+    matches = union_all(*queries).subquery()
+    rows = db.session.execute(
+        select(matches).order_by(matches.c.score.desc(), matches.c.id.desc()).limit(limit).offset(offset)
+    ).all()
+    return [(row.entity, row.id, row.score) for row in rows]
+
+
+@app.route('/search/notes', methods=['GET'])
+def search_notes():
+    """Customers and rentals whose notes match ?q=, best first, with highlighted snippets.
+
+    ?type=customers|rentals narrows it, ?limit= and ?cursor= page through it.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    terms = search_terms(request.args.get('q'))
+    if not terms:
+        return jsonify({'error': 'q must have at least one word'}), 400
+    entities = [request.args['type']] if request.args.get('type') else list(NOTE_FIELDS)
+    if any(entity not in NOTE_FIELDS for entity in entities):
+        return jsonify({'error': 'type must be customers or rentals'}), 400
+    try:
+        limit = min(int(request.args.get('limit', NOTE_SEARCH_PAGE_SIZE)), NOTE_SEARCH_MAX_PAGE_SIZE)
+        offset = int(request.args.get('cursor') or 0)
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be numbers'}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit and cursor must be positive'}), 400
+
+    matches = ranked_note_matches(terms, entities, limit + 1, offset)
+    next_cursor = str(offset + limit) if len(matches) > limit else None
+    matches = matches[:limit]
+
+    # The page's rows in one query per entity
+    ids = collections.defaultdict(list)
+    for entity, row_id, _ in matches:
+        ids[entity].append(row_id)
+    details = {}
+    if ids['customers']:
+        for row in db.session.execute(
+            select(Customers.CustomerID, Customers.FirstName, Customers.LastName, Customers.CustomerNote, Customers.LeaseAgreement)
+            .where(Customers.CustomerID.in_(ids['customers']))
+        ):
+            details['customers', row.CustomerID] = row
+    if ids['rentals']:
+        for row in db.session.execute(
+            select(Rentals.RentalID, Rentals.CustomerID, Rentals.RentalDate, Rentals.InternalNote,
+                   Customers.FirstName, Customers.LastName)
+            .outerjoin(Customers, Customers.CustomerID == Rentals.CustomerID)
+            .where(Rentals.RentalID.in_(ids['rentals']))
+        ):
+            details['rentals', row.RentalID] = row
+
+    results = []
+    for entity, row_id, score in matches:
+        row = details.get((entity, row_id))
+        if row is None:
+            continue
+        snippets = {field: note_snippet(getattr(row, field), terms) for field in NOTE_FIELDS[entity]}
+        results.append({
+            'type': entity,
+            'id': row_id,
+            'customer_id': row.CustomerID,
+            'name': f'{row.FirstName or ""} {row.LastName or ""}'.strip(),
+            'rental_date': row.RentalDate.isoformat() if entity == 'rentals' and row.RentalDate else None,
+            'score': round(float(score), 4),
+            'snippets': {field: snippet for field, snippet in snippets.items() if snippet},
+        })
+
+    return jsonify({'results': results, 'next_cursor': next_cursor})
+
+##############################################################################################################################################################################################################################
+#                                                                            SEARCH                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
+SEED_AGENT_NAME = 'seed-agent'
+SEED_EQUIPMENT_TYPES = ['Mixer', 'Pump', 'Skid Steer', 'Excavator', 'Trailer', 'Compactor']
+SEED_STATUSES = {
+    AgentStatuses: ['Active', 'Inactive'],
+    CustomerStatuses: ['Active', 'Inactive'],
+    EquipmentStatuses: ['Rented', 'Ready to use'],
+    RentalStatuses: ['Active', 'On hold', 'Completed'],
+    VehicleStatuses: ['Active', 'Inactive'],
+}
+
+
+def seed_sample_data(customers, batch_size=IMPORT_BATCH_SIZE, seed=0):
+    """Fill an empty database with ``customers`` synthetic customers and their rentals.
+
+    Every customer gets a completed rental and a vehicle, active customers (about
+    four in five) also have an active rental on a rented unit, and there are spare
+    available units of every type. Rows go in with executemany in batches.
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+
+    for model, names in SEED_STATUSES.items():
+        db.session.execute(insert(model), [{'StatusID': i, 'StatusName': name} for i, name in enumerate(names, 1)])
+    db.session.execute(insert(Agents), [{'AgentName': SEED_AGENT_NAME, 'StatusID': 1,
+                                         'AgentPassword': generate_password_hash(SEED_AGENT_NAME)}])
+    db.session.commit()
+
+    next_equipment_id = 1
+    for first in range(1, customers + 1, batch_size):
+        ids = range(first, min(first + batch_size, customers + 1))
+        customer_rows, equipment_rows, rental_rows, vehicle_rows = [], [], [], []
+        for customer_id in ids:
+            active = rng.random() < 0.8
+            customer_rows.append({
+                'CustomerID': customer_id,
+                'FirstName': f'First{rng.randrange(10000)}',
+                'LastName': f'Last{rng.randrange(10000)}',
+                'Email': f'customer{customer_id}@example.com',
+                'Phone': f'555{rng.randrange(10 ** 7):07d}',
+                'Address': f'{rng.randrange(1, 9999)} Main St',
+                'City': 'Austin',
+                'State': 'TX',
+                'Zip': '78701',
+                'TDL': f'{rng.randrange(10 ** 8):08d}',
+                'TDLExpirationDate': today + datetime.timedelta(days=rng.randrange(-60, 1500)),
+                'InsuranceExpDate': today + datetime.timedelta(days=rng.randrange(-60, 365)),
+                'CustomerNote': '',
+                'StatusID': ACTIVE_CUSTOMER_STATUS_ID if active else INACTIVE_CUSTOMER_STATUS_ID,
+            })
+            for rental_status in ([COMPLETED_RENTAL_STATUS_ID, ACTIVE_STATUS_ID] if active else [COMPLETED_RENTAL_STATUS_ID]):
+                rented = rental_status != COMPLETED_RENTAL_STATUS_ID
+                equipment_rows.append({
+                    'EquipmentID': next_equipment_id,
+                    'EquipmentType': rng.choice(SEED_EQUIPMENT_TYPES),
+                    'Condition': 'Good',
+                    'StatusID': RENTED_STATUS_ID if rented else AVAILABLE_STATUS_ID,
+                })
+                start = today - datetime.timedelta(days=rng.randrange(0, 30) if rented else rng.randrange(30, 720))
+                rental_rows.append({
+                    'CustomerID': customer_id,
+                    'EquipmentID': next_equipment_id,
+                    'RentalDate': start,
+                    'ReturnDate': start + datetime.timedelta(days=rng.randrange(1, 45)),
+                    'ReturnTime': '5:00 PM',
+                    'InternalNote': '',
+                    'StatusID': rental_status,
+                })
+                next_equipment_id += 1
+            vehicle_rows.append({
+                'CustomerID': customer_id,
+                'VehicleMake': 'Ford',
+                'VehicleModel': 'F-250',
+                'VehicleYear': str(rng.randrange(2005, 2025)),
+                'LicensePlate': f'TX{customer_id:07d}',
+                'StatusID': 1,
+            })
+        db.session.execute(insert(Customers), customer_rows)
+        db.session.execute(insert(Equipment), equipment_rows)
+        db.session.execute(insert(Rentals), rental_rows)
+        db.session.execute(insert(Vehicles), vehicle_rows)
+        db.session.commit()
+
+
+def seed_empty_database(customers):
+    """Create the tables and seed them, refusing to touch a database that already has customers."""
+    db.create_all()
+    if note_search_backend() == 'fts5':
+        # create_all() doesn't know the FTS5 table, the migration would have made it
+        note_search_index.ensure()
+    if db.session.execute(select(Customers.CustomerID).limit(1)).first() is not None:
+        raise click.ClickException('The database already has customers, --seed only works on an empty one')
+    seed_sample_data(customers)
+
+
+@app.cli.command('seed-data')
+@click.argument('customers', type=int)
+def seed_data_command(customers):
+    """Create the tables and fill an empty database with CUSTOMERS synthetic customers."""
+    seed_empty_database(customers)
+    click.echo(f'Seeded {customers} customers')
+
+
+@contextlib.contextmanager
+def capture_statements(batches=False, planned_scans=True):
+    """Collect ``(statement, parameters)`` for every statement sent to the database.
+
+    executemany() batches are left out unless ``batches`` is set, and so is
+    anything the background threads (job workers, alert scanner) run meanwhile.
+    Without ``planned_scans``, statements run with the ``full_scan_ok``
+    execution option are left out too.
+    """
+    statements = []
+    thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not planned_scans and context is not None and context.execution_options.get('full_scan_ok'):
+            return
+        if (batches or not executemany) and threading.get_ident() == thread:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def logged_in_client():
+    """A test client signed in as the first active agent."""
+    agent_id = db.session.execute(select(Agents.AgentID).where(Agents.StatusID == 1).order_by(Agents.AgentID).limit(1)).scalar()
+    if agent_id is None:
+        raise click.ClickException('There is no active agent to sign in as')
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session['_user_id'] = str(agent_id)
+        client_session['_fresh'] = True
+    return client
+
+
+def hot_path_requests():
+    """The requests an agent's day is made of, as ``(label, method, url, kwargs)``."""
+    customer_id = db.session.execute(
+        select(Rentals.CustomerID).where(Rentals.StatusID == ACTIVE_STATUS_ID).order_by(Rentals.RentalID.desc()).limit(1)
+    ).scalar()
+    today = datetime.date.today().isoformat()
+    new_customer = {
+        'FirstName': 'Check', 'LastName': 'Customer', 'Email': 'check@example.com', 'Address': '1 Main St',
+        'City': 'Austin', 'State': 'TX', 'Zip': '78701', 'Phone': '5550000000', 'AltPhone': '', 'TDL': '00000000',
+        'TDLExpirationDate': today, 'InsuranceExpDate': today, 'CustomerNote': '', 'EquipmentType': SEED_EQUIPMENT_TYPES[0],
+        'RentalDate': today, 'ReturnDate': today, 'ReturnTime': '5:00 PM', 'InternalNote': '',
+    }
+    return [
+        ('login', 'POST', '/login', {'data': {'username': SEED_AGENT_NAME, 'password': 'not the password'}}),
+        ('display', 'GET', '/display', {}),
+        ('display search', 'GET', '/display/search?name=Fir&email=cust&phone=555&equipment_type=Mi', {}),
+        ('modals', 'GET', '/modals', {}),
+        ('customers api', 'GET', '/api/customers?FirstName=Fir&StatusID=1', {}),
+        ('rentals api', 'GET', f'/api/rentals?CustomerID={customer_id}', {}),
+        ('vehicles api', 'GET', f'/api/vehicles?CustomerID={customer_id}', {}),
+        ('printed page', 'GET', f'/printedPage/{customer_id}', {}),
+        ('printed pages', 'GET', f'/printedPages?rental_date={today}', {}),
+        ('available equipment', 'GET', '/availableEquipment', {}),
+        ('lookups', 'GET', '/lookups', {}),
+        ('alerts', 'GET', '/alerts?type=return', {}),
+        ('calendar', 'GET', f'/calendar?start={today}&days=31', {}),
+        ('audit', 'GET', f'/audit/customers/{customer_id}', {}),
+        ('search notes', 'GET', '/search/notes?q=gate', {}),
+        ('create customer', 'POST', '/create_customer', {'json': new_customer}),
+        ('change status', 'POST', '/changeStatus', {'data': {'customerId': customer_id, 'status': 'Inactive'}}),
+    ]
+
+
+# Status tables are a handful of rows that are read whole on purpose, and so is
+# expiry_alerts, which only holds what the last scan found. SQLite reports every
+# FTS5 lookup in note_search as a SCAN of the virtual table.
+FULL_SCAN_ALLOWED_TABLES = {model.__table__.name for model in SEED_STATUSES} | {ExpiryAlerts.__table__.name, NoteSearchIndex.TABLE}
+
+
+def full_scans(connection, statement, parameters):
+    """Return the tables the database would read in full to run ``statement``.
+
+    A scan that is the outermost loop of a LIMITed query and already delivers
+    rows in ORDER BY order stops after LIMIT rows, so it doesn't count.
+    """
+    limited = re.search(r'\bLIMIT\b', statement, re.IGNORECASE) is not None
+
+    if connection.dialect.name == 'sqlite':
+        details = [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        sorted_after = any(detail.startswith('USE TEMP B-TREE') for detail in details)
+        accesses = [detail for detail in details if detail.startswith(('SCAN ', 'SEARCH '))]
+        tables = [(detail.split()[1], detail.startswith('SCAN ')) for detail in accesses]
+    else:
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+        sorted_after = any('filesort' in (row['Extra'] or '') or 'temporary' in (row['Extra'] or '') for row in rows)
+        tables = [(row['table'], row['type'] in ('ALL', 'index')) for row in rows if row['table']]
+
+    scanned = []
+    for position, (table, is_scan) in enumerate(tables):
+        if not is_scan or table in FULL_SCAN_ALLOWED_TABLES:
+            continue
+        if position == 0 and limited and not sorted_after:
+            continue
+        scanned.append(table)
+    return scanned
+
+
+@app.cli.command('explain-check')
+@click.option('--seed', type=int, help='Create the tables and seed this many customers first (empty database only).')
+def explain_check_command(seed):
+    """Fail if a query behind a hot route would scan a whole table.
+
+    Replays hot_path_requests() against the configured database and runs EXPLAIN
+    on every statement they send. It books and deactivates a customer, so point
+    DATABASE_URL at a scratch database.
+    """
+    if seed:
+        seed_empty_database(seed)
+
+    client = logged_in_client()
+    failures = 0
+    for label, method, url, kwargs in hot_path_requests() + [('alert scan', None, None, None)]:
+        with capture_statements(planned_scans=False) as statements:
+            if method is None:
+                scan_expiry_alerts()
+            else:
+                response = client.open(url, method=method, **kwargs)
+                # Streamed bodies run their queries as they are read
+                response.get_data()
+        if method is not None and response.status_code >= 500:
+            click.echo(f'{label}: {method} {url} answered {response.status_code}', err=True)
+            failures += 1
+
+        seen = set()
+        with db.engine.connect() as connection:
+            for statement, parameters in statements:
+                if statement in seen or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                seen.add(statement)
+                scanned = full_scans(connection, statement, parameters)
+                if scanned:
+                    failures += 1
+                    click.echo(f'{label}: full scan of {", ".join(scanned)} in\n    {" ".join(statement.split())}', err=True)
+
+    if failures:
+        raise click.ClickException(f'{failures} problem(s) found')
+    click.echo('No full table scans on the hot paths')
+
+
+# The most statements each hot_path_requests() entry may send, signing the agent in included.
+# An entry that grows past its budget is usually a lazy load in a loop (N+1).
+QUERY_BUDGETS = {
+    'login': 1,
+    'display': 2,
+    'display search': 2,
+    'modals': 4,
+    'customers api': 2,
+    'rentals api': 2,
+    'vehicles api': 2,
+    'printed page': 2,
+    # Constant however many agreements: the day's customers, then all of them in one go
+    'printed pages': 3,
+    'available equipment': 2,
+    'lookups': 5,
+    'alerts': 2,
+    # The calendar loads the fleet and its open rentals on first use
+    'calendar': 3,
+    'audit': 2,
+    # Ranked matches, then the customers and the rentals on the page
+    'search notes': 3,
+    'create customer': 5,
+    # Includes asking whether another open rental still has the freed units out
+    'change status': 7,
+}
+
+
+@app.cli.command('check-query-budgets')
+@click.option('--seed', type=int, help='Create the tables and seed this many customers first (empty database only).')
+@click.option('--verbose', is_flag=True, help='Print the statements of every request.')
+def check_query_budgets_command(seed, verbose):
+    """Fail if a hot route sends more SQL statements than QUERY_BUDGETS allows.
+
+    Replays hot_path_requests() like explain-check does, so point DATABASE_URL
+    at a scratch database.
+    """
+    if seed:
+        seed_empty_database(seed)
+    lookup_cache.invalidate()
+
+    client = logged_in_client()
+    failures = 0
+    for label, method, url, kwargs in hot_path_requests():
+        # Budgets are for a worker that doesn't know the agent yet, nor has change log entries
+        # from earlier requests waiting (the audit route writes those before reading)
+        identity_cache.invalidate()
+        audit_log.flush()
+        # A fresh app context gives the request its own session and g, like a real request
+        with app.app_context(), capture_statements(batches=True) as statements:
+            response = client.open(url, method=method, **kwargs)
+            response.get_data()
+        budget = QUERY_BUDGETS.get(label)
+        if response.status_code >= 500:
+            click.echo(f'{label}: {method} {url} answered {response.status_code}', err=True)
+            failures += 1
+        if budget is None:
+            click.echo(f'{label}: no budget in QUERY_BUDGETS ({len(statements)} statements)', err=True)
+            failures += 1
+        elif len(statements) > budget:
+            click.echo(f'{label}: {len(statements)} statements, budget is {budget}', err=True)
+            failures += 1
+        else:
+            click.echo(f'{label}: {len(statements)}/{budget}')
+        if verbose or (budget is not None and len(statements) > budget):
+            for statement, parameters in statements:
+                click.echo(f'    {" ".join(statement.split())}', err=True)
+
+    if failures:
+        raise click.ClickException(f'{failures} problem(s) found')
+    click.echo('Every hot route is within its query budget')
+
+
+@app.cli.command('check-status-cascade')
+@click.option('--seed', type=int, help='Create the tables and seed this many customers first (empty database only).')
+def check_status_cascade_command(seed):
+    """Fail if making a customer inactive frees a unit that is still out on another rental.
+
+    Reserves a rented unit for later on another customer, deactivates that
+    customer and expects the unit to stay rented, then deactivates the customer
+    who has it out and expects it back. It changes data, so point DATABASE_URL
+    at a scratch database.
+    """
+    if seed:
+        seed_empty_database(seed)
+
+    today = datetime.date.today()
+    rental = db.session.execute(
+        select(Rentals.CustomerID, Rentals.EquipmentID, Rentals.ReturnDate, Equipment.EquipmentType)
+        .join(Equipment, Equipment.EquipmentID == Rentals.EquipmentID)
+        .join(Customers, Customers.CustomerID == Rentals.CustomerID)
+        .where(Rentals.StatusID == ACTIVE_STATUS_ID, Equipment.StatusID == RENTED_STATUS_ID, Customers.StatusID == 1,
+               or_(Rentals.RentalDate <= today, Rentals.RentalDate.is_(None)), Rentals.ReturnDate.isnot(None))
+        .order_by(Rentals.RentalID.desc()).limit(1)
+    ).first()
+    other_customer_id = rental and db.session.execute(
+        select(Customers.CustomerID).where(Customers.StatusID == 1, Customers.CustomerID != rental.CustomerID)
+        .order_by(Customers.CustomerID.desc()).limit(1)
+    ).scalar()
+    if other_customer_id is None:
+        raise click.ClickException('There is no rented unit and second active customer to check with')
+    start = max(today, rental.ReturnDate) + datetime.timedelta(days=30)
+    db.session.remove()
+
+    def equipment_state():
+        with app.app_context():
+            status_id = db.session.get(Equipment, rental.EquipmentID).StatusID
+            free = rental.EquipmentID in availability_index.candidates(rental.EquipmentType, None)
+            return status_id, free
+
+    client = logged_in_client()
+    failures = []
+    with app.app_context():
+        response = client.post('/create_rental', json={
+            'CustomerID': other_customer_id, 'EquipmentID': rental.EquipmentID, 'RentalDate': start.isoformat(),
+            'ReturnDate': (start + datetime.timedelta(days=2)).isoformat(), 'ReturnTime': '5:00 PM', 'InternalNote': '',
+        })
+    if response.status_code != 200:
+        raise click.ClickException(f'Reserving unit {rental.EquipmentID} answered {response.status_code}: {response.get_data(as_text=True)}')
+
+    with app.app_context():
+        client.post('/changeStatus', data={'customerId': other_customer_id, 'status': 'Inactive'})
+    if equipment_state() != (RENTED_STATUS_ID, False):
+        failures.append(f'unit {rental.EquipmentID} was freed with its reservation although customer {rental.CustomerID} has it out')
+
+    with app.app_context():
+        client.post('/changeStatus', data={'customerId': rental.CustomerID, 'status': 'Inactive'})
+    if equipment_state() != (AVAILABLE_STATUS_ID, True):
+        failures.append(f'unit {rental.EquipmentID} was not freed when customer {rental.CustomerID}\'s rental was completed')
+
+    for failure in failures:
+        click.echo(failure, err=True)
+    if failures:
+        raise click.ClickException(f'{len(failures)} problem(s) found')
+    click.echo('Deactivating customers frees only the units they have out')
+
+
+def bench_targets():
+    """The routes ``flask bench`` times, as ``name -> make_request(rng, ids)``.
+
+    ``ids`` holds the highest id of every seeded table, make_request returns
+    ``(method, url, kwargs)`` for one request against a random row.
+    """
+    def new_customer(rng, ids):
+        today = datetime.date.today().isoformat()
+        return 'POST', '/create_customer', {'json': {
+            'FirstName': f'Bench{rng.randrange(10000)}', 'LastName': 'Customer', 'Email': 'bench@example.com',
+            'Address': '1 Main St', 'City': 'Austin', 'State': 'TX', 'Zip': '78701', 'Phone': '5550000000', 'AltPhone': '',
+            'TDL': '00000000', 'TDLExpirationDate': today, 'InsuranceExpDate': today, 'CustomerNote': '',
+            'EquipmentType': rng.choice(SEED_EQUIPMENT_TYPES), 'RentalDate': today, 'ReturnDate': today,
+            'ReturnTime': '5:00 PM', 'InternalNote': '',
+        }}
+
+    return {
+        'display': lambda rng, ids: ('GET', '/display', {}),
+        'modals': lambda rng, ids: ('GET', '/modals', {}),
+        # A full JSON page, compressed like a browser would ask for it
+        'customers_api': lambda rng, ids: ('GET', '/api/customers?limit=500', {'headers': {'Accept-Encoding': 'br, gzip'}}),
+        'printed_page': lambda rng, ids: ('GET', f'/printedPage/{rng.randint(1, ids["customers"])}', {}),
+        'printed_pages': lambda rng, ids: ('GET', '/printedPages?customer_ids=' + ','.join(
+            str(rng.randint(1, ids['customers'])) for _ in range(20)), {}),
+        'create_customer': new_customer,
+        'update_customer': lambda rng, ids: ('PUT', f'/update_customer/{rng.randint(1, ids["customers"])}',
+                                             {'json': {'CustomerNote': f'bench {rng.randrange(10 ** 6)}'}}),
+        'update_equipment': lambda rng, ids: ('PUT', f'/update_equipment/{rng.randint(1, ids["equipment"])}',
+                                              {'json': {'Condition': rng.choice(['Good', 'Fair'])}}),
+        'update_rentals': lambda rng, ids: ('PUT', f'/update_rentals/{rng.randint(1, ids["rentals"])}',
+                                            {'json': {'InternalNote': f'bench {rng.randrange(10 ** 6)}'}}),
+        'update_vehicles': lambda rng, ids: ('PUT', f'/update_vehicles/{rng.randint(1, ids["vehicles"])}',
+                                             {'json': {'VehicleModel': rng.choice(['F-250', 'F-350'])}}),
+        'change_status': lambda rng, ids: ('POST', '/changeStatus', {'data': {
+            'customerId': rng.randint(1, ids['customers']), 'status': rng.choice(['Active', 'Inactive'])}}),
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def git_revision():
+    """``(commit, dirty)`` of the checkout app.py lives in, ``(None, None)`` outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=app.root_path, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=app.root_path,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def run_bench(name, make_request, clients, ids, requests_per_target, warmup, seed):
+    """Send ``requests_per_target`` requests split over ``clients`` threads and summarize them."""
+    def worker(index, count):
+        rng = random.Random(f'{seed}-{name}-{index}')
+        client = clients[index]
+        timings, statuses = [], collections.Counter()
+        for number in range(warmup + count):
+            if number == warmup:
+                timed.wait()
+            method, url, kwargs = make_request(rng, ids)
+            started = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            if number >= warmup:
+                timings.append(elapsed)
+                statuses[response.status_code] += 1
+        return timings, statuses
+
+    shares = [requests_per_target // len(clients) + (1 if i < requests_per_target % len(clients) else 0) for i in range(len(clients))]
+    threads, results, started = [], [None] * len(clients), []
+    # Every client finishes its warmup before the clock starts
+    timed = threading.Barrier(len(clients), action=lambda: started.append(time.perf_counter()))
+    for index, count in enumerate(shares):
+        thread = threading.Thread(target=lambda index=index, count=count: results.__setitem__(index, worker(index, count)))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started[0]
+
+    timings = sorted(timing for result in results for timing in result[0])
+    statuses = sum((result[1] for result in results), collections.Counter())
+    milliseconds = [timing * 1000 for timing in timings]
+    return {
+        'requests': len(timings),
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'seconds': round(wall_seconds, 4),
+        'throughput_rps': round(len(timings) / wall_seconds, 2) if wall_seconds else None,
+        'mean_ms': round(sum(milliseconds) / len(milliseconds), 3) if milliseconds else None,
+        'p50_ms': round(percentile(milliseconds, 0.5), 3) if milliseconds else None,
+        'p90_ms': round(percentile(milliseconds, 0.9), 3) if milliseconds else None,
+        'p99_ms': round(percentile(milliseconds, 0.99), 3) if milliseconds else None,
+        'max_ms': round(milliseconds[-1], 3) if milliseconds else None,
+    }
+
+
+@app.cli.command('bench')
+@click.option('--seed', 'seed_customers', type=int, help='Create the tables and seed this many customers first (empty database only).')
+@click.option('--requests', 'requests_per_target', type=int, default=200, show_default=True, help='Timed requests per route.')
+@click.option('--warmup', type=int, default=10, show_default=True, help='Untimed requests per client before timing a route.')
+@click.option('--concurrency', type=int, default=1, show_default=True, help='Signed-in clients sending requests at once.')
+@click.option('--only', multiple=True, help='Only time these routes (repeatable), see bench_targets().')
+@click.option('--random-seed', type=int, default=0, show_default=True, help='Makes the request mix reproducible.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='Write the JSON results here instead of stdout.')
+def bench_command(seed_customers, requests_per_target, warmup, concurrency, only, random_seed, output):
+    """Time the agent-facing routes in process and print throughput and latency as JSON.
+
+    Requests go through the Flask test client, so this measures the app and the
+    database without a web server in front. It creates customers and changes
+    statuses, so point DATABASE_URL at a scratch database, e.g.
+
+        DATABASE_URL=sqlite:////tmp/bench.db flask bench --seed 100000 --output before.json
+    """
+    if seed_customers:
+        started = time.perf_counter()
+        seed_empty_database(seed_customers)
+        click.echo(f'Seeded {seed_customers} customers in {time.perf_counter() - started:.1f}s', err=True)
+
+    targets = bench_targets()
+    unknown = set(only) - set(targets)
+    if unknown:
+        raise click.BadParameter(f'unknown route(s) {", ".join(sorted(unknown))}, pick from {", ".join(targets)}', param_hint='--only')
+    if only:
+        targets = {name: targets[name] for name in targets if name in only}
+
+    ids = {
+        'customers': db.session.execute(select(func.max(Customers.CustomerID))).scalar(),
+        'equipment': db.session.execute(select(func.max(Equipment.EquipmentID))).scalar(),
+        'rentals': db.session.execute(select(func.max(Rentals.RentalID))).scalar(),
+        'vehicles': db.session.execute(select(func.max(Vehicles.VehicleID))).scalar(),
+    }
+    if not all(ids.values()):
+        raise click.ClickException('The database has no customers, equipment, rentals or vehicles yet, run with --seed')
+    clients = [logged_in_client() for _ in range(concurrency)]
+    db.session.remove()
+
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': db.engine.dialect.name,
+        'customers': db.session.execute(select(func.count()).select_from(Customers)).scalar(),
+        'concurrency': concurrency,
+        'warmup': warmup,
+        'random_seed': random_seed,
+        'results': {},
+    }
+    db.session.remove()
+    for name, make_request in targets.items():
+        report['results'][name] = result = run_bench(name, make_request, clients, ids, requests_per_target, warmup, random_seed)
+        click.echo(f'{name}: {result["throughput_rps"]} req/s, p50 {result["p50_ms"]} ms, p99 {result["p99_ms"]} ms, '
+                   f'{result["errors"]} errors', err=True)
+
+    document = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as handle:
+            handle.write(document + '\n')
+    else:
+        click.echo(document)
+
+##############################################################################################################################################################################################################################
+#                                                                            LOCAL DATABASE TOOLS                                                                                                                                          #
+##############################################################################################################################################################################################################################
+
 
 # if __name__ == '__main__':
 #     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,67 @@
+"""add note search
+
+Revision ID: 75bd67acc2c6
+Revises: fbef53487612
+Create Date: 2026-10-18 07:39:24.775574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '75bd67acc2c6'
+down_revision = 'fbef53487612'
+branch_labels = None
+depends_on = None
+
+# Same as NoteSearchIndex.SCHEMA in app.py
+NOTE_SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS note_search_customers_insert AFTER INSERT ON customers BEGIN
+        INSERT INTO note_search (rowid, note, lease) SELECT new."CustomerID" * 2, new."CustomerNote", new."LeaseAgreement"
+        WHERE new."CustomerNote" IS NOT NULL OR new."LeaseAgreement" IS NOT NULL; END""",
+    """CREATE TRIGGER IF NOT EXISTS note_search_customers_update AFTER UPDATE OF "CustomerNote", "LeaseAgreement" ON customers BEGIN
+        DELETE FROM note_search WHERE rowid = old."CustomerID" * 2;
+        INSERT INTO note_search (rowid, note, lease) SELECT new."CustomerID" * 2, new."CustomerNote", new."LeaseAgreement"
+        WHERE new."CustomerNote" IS NOT NULL OR new."LeaseAgreement" IS NOT NULL; END""",
+    """CREATE TRIGGER IF NOT EXISTS note_search_customers_delete AFTER DELETE ON customers BEGIN
+        DELETE FROM note_search WHERE rowid = old."CustomerID" * 2; END""",
+    """CREATE TRIGGER IF NOT EXISTS note_search_rentals_insert AFTER INSERT ON rentals BEGIN
+        INSERT INTO note_search (rowid, note) SELECT new."RentalID" * 2 + 1, new."InternalNote"
+        WHERE new."InternalNote" IS NOT NULL; END""",
+    """CREATE TRIGGER IF NOT EXISTS note_search_rentals_update AFTER UPDATE OF "InternalNote" ON rentals BEGIN
+        DELETE FROM note_search WHERE rowid = old."RentalID" * 2 + 1;
+        INSERT INTO note_search (rowid, note) SELECT new."RentalID" * 2 + 1, new."InternalNote"
+        WHERE new."InternalNote" IS NOT NULL; END""",
+    """CREATE TRIGGER IF NOT EXISTS note_search_rentals_delete AFTER DELETE ON rentals BEGIN
+        DELETE FROM note_search WHERE rowid = old."RentalID" * 2 + 1; END""",
+)
+NOTE_SEARCH_TRIGGER_NAMES = [statement.split()[5] for statement in NOTE_SEARCH_TRIGGERS]
+
+
+def upgrade():
+    # MySQL searches the note columns through FULLTEXT indexes, SQLite through an
+    # FTS5 table that triggers keep in step with them (see NoteSearchIndex in app.py)
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.create_index('ft_customers_notes', 'customers', ['CustomerNote', 'LeaseAgreement'], mysql_prefix='FULLTEXT')
+        op.create_index('ft_rentals_notes', 'rentals', ['InternalNote'], mysql_prefix='FULLTEXT')
+    elif dialect == 'sqlite':
+        op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS note_search USING fts5(note, lease)')
+        for statement in NOTE_SEARCH_TRIGGERS:
+            op.execute(statement)
+        op.execute('DELETE FROM note_search')
+        op.execute('INSERT INTO note_search (rowid, note, lease) SELECT "CustomerID" * 2, "CustomerNote", "LeaseAgreement" '
+                   'FROM customers WHERE "CustomerNote" IS NOT NULL OR "LeaseAgreement" IS NOT NULL')
+        op.execute('INSERT INTO note_search (rowid, note) SELECT "RentalID" * 2 + 1, "InternalNote" '
+                   'FROM rentals WHERE "InternalNote" IS NOT NULL')
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.drop_index('ft_rentals_notes', table_name='rentals')
+        op.drop_index('ft_customers_notes', table_name='customers')
+    elif dialect == 'sqlite':
+        for name in NOTE_SEARCH_TRIGGER_NAMES:
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+        op.execute('DROP TABLE IF EXISTS note_search')
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its settings from the environment when it is imported, so the
+# test database and the fragment cache file are pointed at a scratch folder first
+SCRATCH = tempfile.mkdtemp(prefix='concrete-help-desk-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'test.db')
+os.environ['SECRET_KEY'] = 'tests'
+os.environ['FRAGMENT_CACHE_PATH'] = os.path.join(SCRATCH, 'fragments.sqlite3')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+# Enough customers for several pages of every table
+SEED_CUSTOMERS = 200
+
+
+@pytest.fixture(scope='session')
+def seeded():
+    """The app module, its database seeded once for the whole run by `flask seed-data`."""
+    result = app_module.app.test_cli_runner().invoke(args=['seed-data', str(SEED_CUSTOMERS)])
+    assert result.exit_code == 0, result.output
+    return app_module
+
+
+@pytest.fixture
+def runner(seeded):
+    return seeded.app.test_cli_runner()
+
+
+@pytest.fixture
+def client(seeded):
+    """A test client signed in as the seeded agent."""
+    with seeded.app.app_context():
+        return seeded.logged_in_client()
+
+
+@pytest.fixture
+def fetch(seeded):
+    """Run a statement in an app context of its own and return all its rows."""
+    def fetch(statement):
+        with seeded.app.app_context():
+            return seeded.db.session.execute(statement).all()
+    return fetch
@@ -0,0 +1,77 @@
+import datetime
+import itertools
+
+import pytest
+from sqlalchemy import func, select
+
+units = itertools.count(1)
+
+
+@pytest.fixture
+def unit(seeded, client, fetch):
+    """``(EquipmentID, EquipmentType)`` of a new unit of a type of its own, so nothing else books it."""
+    equipment_type = f'Test Unit {next(units)}'
+    assert client.post('/create_equipment', json={'EquipmentType': equipment_type, 'EquipmentCondition': 'Good'}).status_code == 200
+    equipment_id = fetch(select(func.max(seeded.Equipment.EquipmentID)).where(seeded.Equipment.EquipmentType == equipment_type))[0][0]
+    return equipment_id, equipment_type
+
+
+@pytest.fixture
+def customer_ids(seeded, fetch):
+    return [row[0] for row in fetch(
+        select(seeded.Customers.CustomerID).where(seeded.Customers.StatusID == seeded.ACTIVE_CUSTOMER_STATUS_ID)
+        .order_by(seeded.Customers.CustomerID).limit(2)
+    )]
+
+
+def book(client, customer_id, start, days, **unit):
+    return client.post('/create_rental', json=dict(unit, **{
+        'CustomerID': customer_id, 'RentalDate': start.isoformat(), 'ReturnDate': (start + datetime.timedelta(days=days)).isoformat(),
+        'ReturnTime': '5:00 PM', 'InternalNote': '',
+    }))
+
+
+def unit_status(seeded, fetch, equipment_id):
+    return fetch(select(seeded.Equipment.StatusID).where(seeded.Equipment.EquipmentID == equipment_id))[0][0]
+
+
+def test_overlapping_reservations_of_a_unit_conflict(seeded, client, fetch, unit, customer_ids):
+    equipment_id, _ = unit
+    start = datetime.date.today() + datetime.timedelta(days=60)
+    first, second = customer_ids
+
+    assert book(client, first, start, 5, EquipmentID=equipment_id).status_code == 200
+    # A reservation leaves the unit available until its day comes
+    assert unit_status(seeded, fetch, equipment_id) == seeded.AVAILABLE_STATUS_ID
+
+    overlapping = book(client, second, start + datetime.timedelta(days=3), 5, EquipmentID=equipment_id)
+    assert overlapping.status_code == 409
+    assert overlapping.get_json()['error'] == 'That equipment is not free for those dates'
+    assert book(client, second, start + datetime.timedelta(days=6), 5, EquipmentID=equipment_id).status_code == 200
+
+
+def test_a_unit_out_today_cannot_be_booked_again(seeded, client, fetch, unit, customer_ids):
+    equipment_id, _ = unit
+    first, second = customer_ids
+
+    assert book(client, first, datetime.date.today(), 3, EquipmentID=equipment_id).status_code == 200
+    assert unit_status(seeded, fetch, equipment_id) == seeded.RENTED_STATUS_ID
+    assert book(client, second, datetime.date.today(), 1, EquipmentID=equipment_id).status_code == 409
+
+
+def test_booking_by_type_skips_reserved_units(client, unit, customer_ids):
+    equipment_id, equipment_type = unit
+    start = datetime.date.today() + datetime.timedelta(days=90)
+    first, second = customer_ids
+
+    response = book(client, first, start, 2, EquipmentType=equipment_type)
+    assert response.status_code == 200
+    assert response.get_json()['equipment_id'] == equipment_id
+    # The only unit of the type is taken over those dates
+    assert book(client, second, start + datetime.timedelta(days=1), 2, EquipmentType=equipment_type).status_code == 404
+
+
+def test_return_before_rental_date_is_rejected(client, unit, customer_ids):
+    response = book(client, customer_ids[0], datetime.date.today(), -2, EquipmentID=unit[0])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'ReturnDate is before RentalDate'
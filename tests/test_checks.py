@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize('command, passed', [
+    ('explain-check', 'No full table scans on the hot paths'),
+    ('check-query-budgets', 'Every hot route is within its query budget'),
+    ('check-status-cascade', 'Deactivating customers frees only the units they have out'),
+])
+def test_check_passes(runner, command, passed):
+    result = runner.invoke(args=[command])
+    assert result.exit_code == 0, result.output
+    assert passed in result.output
+
+
+def test_seed_refuses_a_database_with_customers(runner):
+    result = runner.invoke(args=['explain-check', '--seed', '5'])
+    assert result.exit_code != 0
+    assert 'only works on an empty one' in result.output
@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+
+@pytest.fixture
+def rental_id(seeded, fetch):
+    """A completed rental, editing it books or frees nothing."""
+    return fetch(select(func.max(seeded.Rentals.RentalID)).where(seeded.Rentals.StatusID == seeded.COMPLETED_RENTAL_STATUS_ID))[0][0]
+
+
+def test_patch_coerces_values_and_reports_ignored_keys(seeded, client, fetch, rental_id):
+    response = client.patch(f'/api/rentals/{rental_id}', json={
+        'ReturnDate': '2026-11-02T09:30:00', 'InternalNote': 1234, 'RentalID': 1, 'EquipmentType': 'Mixer',
+    })
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['ignored'] == ['EquipmentType', 'RentalID']
+
+    rental = fetch(select(seeded.Rentals.ReturnDate, seeded.Rentals.InternalNote).where(seeded.Rentals.RentalID == rental_id))[0]
+    assert tuple(rental) == (datetime.date(2026, 11, 2), '1234')
+
+
+def test_patch_clears_a_value_sent_empty(seeded, client, fetch, rental_id):
+    assert client.patch(f'/api/rentals/{rental_id}', json={'InternalNote': ''}).status_code == 200
+    assert fetch(select(seeded.Rentals.InternalNote).where(seeded.Rentals.RentalID == rental_id))[0][0] is None
+
+
+@pytest.mark.parametrize('changes, error', [
+    ({'ReturnDate': 'next week'}, 'ReturnDate must be a YYYY-MM-DD date'),
+    ({'StatusID': True}, 'StatusID must be an integer'),
+    ({'StatusID': 1.5}, 'StatusID must be an integer'),
+    ({'StatusID': 99}, 'StatusID 99 does not exist'),
+    ({'InternalNote': {'text': 'x'}}, 'InternalNote must be text'),
+    ({'ReturnTime': 'x' * 300}, 'ReturnTime is longer than 255 characters'),
+])
+def test_patch_rejects_values_it_cannot_coerce(client, rental_id, changes, error):
+    response = client.patch(f'/api/rentals/{rental_id}', json=changes)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+def test_patch_answers_404_for_a_missing_row(client):
+    assert client.patch('/api/rentals/999999', json={'InternalNote': 'x'}).status_code == 404
+    assert client.patch('/api/invoices/1', json={'InternalNote': 'x'}).status_code == 404
+
+
+def test_batch_edit_saves_nothing_unless_every_row_is_found(seeded, client, fetch, rental_id):
+    response = client.post('/api/edits', json={'edits': [
+        {'table': 'rentals', 'id': rental_id, 'changes': {'InternalNote': 'batch'}},
+        {'table': 'rentals', 'id': 999999, 'changes': {'InternalNote': 'batch'}},
+    ]})
+    assert response.status_code == 404
+    assert [result['status'] for result in response.get_json()['results']] == ['updated', 'not_found']
+    assert fetch(select(seeded.Rentals.InternalNote).where(seeded.Rentals.RentalID == rental_id))[0][0] != 'batch'
+
+
+def test_batch_edit_rejects_an_invalid_edit_before_writing(client, rental_id):
+    response = client.post('/api/edits', json={'edits': [
+        {'table': 'rentals', 'id': rental_id, 'changes': {'InternalNote': 'batch'}},
+        {'table': 'rentals', 'id': '7', 'changes': {}},
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['results'][1]['error'] == 'id must be an integer'
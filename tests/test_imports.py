@@ -0,0 +1,80 @@
+import datetime
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+
+def jsonl(*records):
+    return '\n'.join(record if isinstance(record, str) else json.dumps(record) for record in records) + '\n'
+
+
+@pytest.fixture
+def customer_id(seeded, fetch):
+    return fetch(select(func.min(seeded.Customers.CustomerID)))[0][0]
+
+
+def test_import_reports_bad_lines_and_keeps_the_good_ones(seeded, client, fetch, customer_id):
+    body = jsonl(
+        {'FirstName': 'Imported', 'LastName': 'One', 'TDLExpirationDate': '2027-01-31'},
+        '{"FirstName": "Broken"',
+        {'FirstName': 'Imported'},
+        {'FirstName': 'Imported', 'LastName': 'Two', 'Shoe size': 11},
+        {'FirstName': 'Imported', 'LastName': 'Three', 'TDLExpirationDate': 'soon'},
+    )
+    response = client.post('/import/customers', data=body, content_type='application/jsonl')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['lines'], report['inserted'], report['error_count']) == (5, 1, 4)
+    assert [error['line'] for error in report['errors']] == [2, 3, 4, 5]
+    assert report['errors'][1]['error'] == 'Missing required fields: LastName'
+
+    imported = fetch(select(seeded.Customers.TDLExpirationDate).where(seeded.Customers.LastName == 'One'))
+    assert imported == [(datetime.date(2027, 1, 31),)]
+
+
+def test_import_reads_csv(seeded, client, fetch):
+    body = 'FirstName,LastName,Email\nCsv,Imported,csv@example.com\nCsv,,missing@example.com\n'
+    report = client.post('/import/customers', data=body, content_type='text/csv').get_json()
+    assert (report['inserted'], report['error_count']) == (1, 1)
+    assert report['errors'][0]['line'] == 3
+    assert fetch(select(seeded.Customers.Email).where(seeded.Customers.LastName == 'Imported')) == [('csv@example.com',)]
+
+
+def test_imported_rentals_are_checked_against_customers_and_units(seeded, client, fetch, customer_id):
+    completed = seeded.COMPLETED_RENTAL_STATUS_ID
+    body = jsonl(
+        {'CustomerID': 999999, 'EquipmentID': 1, 'StatusID': completed},
+        {'CustomerID': customer_id, 'EquipmentType': 'Mixer', 'StatusID': completed},
+        {'CustomerID': customer_id, 'EquipmentID': 1, 'StatusID': completed, 'InternalNote': 'imported history'},
+        {'CustomerID': customer_id},
+    )
+    report = client.post('/import/rentals', data=body, content_type='application/jsonl').get_json()
+    assert report['inserted'] == 1
+    # Lines that fail on their own are reported as they are read, the rest when their batch is checked
+    assert sorted(report['errors'], key=lambda error: error['line']) == [
+        {'line': 1, 'error': 'CustomerID 999999 does not exist'},
+        {'line': 2, 'error': 'A rental that is not open needs the EquipmentID that was out'},
+        {'line': 4, 'error': 'Rentals need an EquipmentID or an EquipmentType'},
+    ]
+    assert fetch(select(seeded.Rentals.EquipmentID).where(seeded.Rentals.InternalNote == 'imported history')) == [(1,)]
+
+
+def test_imported_open_rentals_book_a_free_unit(seeded, client, fetch, customer_id):
+    assert client.post('/create_equipment', json={'EquipmentType': 'Import Unit', 'EquipmentCondition': 'Good'}).status_code == 200
+    start = datetime.date.today() + datetime.timedelta(days=30)
+    rental = {'CustomerID': customer_id, 'EquipmentType': 'Import Unit', 'RentalDate': start.isoformat(),
+              'ReturnDate': (start + datetime.timedelta(days=2)).isoformat()}
+
+    report = client.post('/import/rentals?batch_size=1', data=jsonl(rental, rental), content_type='application/jsonl').get_json()
+    assert report['inserted'] == 1
+    assert report['errors'] == [{'line': 2, 'error': 'No Import Unit is free for those dates'}]
+    booked = fetch(
+        select(seeded.Equipment.EquipmentType).join(seeded.Rentals, seeded.Rentals.EquipmentID == seeded.Equipment.EquipmentID)
+        .where(seeded.Rentals.RentalDate == start, seeded.Rentals.CustomerID == customer_id)
+    )
+    assert booked == [('Import Unit',)]
+
+
+def test_import_of_an_unknown_entity_is_refused(client):
+    assert client.post('/import/invoices', data='{}\n', content_type='application/jsonl').status_code == 404
@@ -0,0 +1,97 @@
+import datetime
+
+import pytest
+from sqlalchemy import func, select, update
+
+WORKER = 'tests:0'
+
+
+@pytest.fixture
+def run_queued_jobs(seeded):
+    """Run every runnable job the way a `flask run-jobs` worker would, return how many ran."""
+    def run_queued_jobs():
+        ran = 0
+        with seeded.app.test_request_context():
+            while (job_id := seeded.claim_next_job(WORKER)) is not None:
+                seeded.run_job(job_id, WORKER)
+                ran += 1
+        return ran
+    return run_queued_jobs
+
+
+@pytest.fixture
+def customer_id(seeded, fetch):
+    return fetch(select(func.min(seeded.Customers.CustomerID)))[0][0]
+
+
+def submit(client, kind, **payload):
+    response = client.post('/jobs', json={'kind': kind, 'payload': payload})
+    assert response.status_code == 202, response.get_json()
+    return response.get_json()['job_id']
+
+
+def test_a_job_runs_and_serves_its_result(client, run_queued_jobs, customer_id):
+    job_id = submit(client, 'printed_page', customer_id=customer_id)
+    assert client.get(f'/jobs/{job_id}').get_json()['status'] == 'queued'
+    assert client.get(f'/jobs/{job_id}/result').status_code == 409
+
+    assert run_queued_jobs() >= 1
+    job = client.get(f'/jobs/{job_id}').get_json()
+    assert (job['status'], job['attempts']) == ('succeeded', 1)
+    result = client.get(job['result_url'])
+    assert result.status_code == 200
+    assert result.mimetype == 'text/html'
+
+
+def test_a_job_that_cannot_succeed_fails_without_retrying(client, run_queued_jobs):
+    job_id = submit(client, 'change_status', customer_ids=[1], status='Retired')
+    run_queued_jobs()
+    job = client.get(f'/jobs/{job_id}').get_json()
+    assert (job['status'], job['attempts'], job['error']) == ('failed', 1, 'Invalid status')
+
+
+def test_a_queued_job_can_be_cancelled(client, run_queued_jobs, customer_id):
+    job_id = submit(client, 'printed_page', customer_id=customer_id)
+    assert client.post(f'/jobs/{job_id}/cancel').status_code == 200
+    run_queued_jobs()
+    assert client.get(f'/jobs/{job_id}').get_json()['status'] == 'cancelled'
+
+
+def test_unknown_jobs_are_refused(client):
+    assert client.post('/jobs', json={'kind': 'mine_bitcoin'}).status_code == 400
+    assert client.post('/jobs', json={'kind': 'printed_page', 'payload': [1]}).status_code == 400
+    assert client.get('/jobs/999999').status_code == 404
+
+
+@pytest.mark.parametrize('attempts, status', [(1, 'queued'), (3, 'failed')])
+def test_jobs_of_a_stopped_worker_are_requeued_until_out_of_attempts(seeded, client, fetch, customer_id, attempts, status):
+    job_id = submit(client, 'printed_page', customer_id=customer_id)
+    silent_since = seeded.utc_now() - datetime.timedelta(seconds=seeded.app.config['JOB_TIMEOUT_SECONDS'] + 60)
+    with seeded.app.app_context():
+        # Claimed by a worker that stopped heartbeating, as if it died mid-job
+        seeded.db.session.execute(
+            update(seeded.Jobs).where(seeded.Jobs.JobID == job_id)
+            .values(Status='running', Attempts=attempts, LockedBy='gone:1:0', StartedAt=silent_since, HeartbeatAt=silent_since)
+        )
+        seeded.db.session.commit()
+        seeded.requeue_stale_jobs()
+
+    job = fetch(select(seeded.Jobs.Status, seeded.Jobs.Attempts, seeded.Jobs.LockedBy).where(seeded.Jobs.JobID == job_id))[0]
+    assert tuple(job) == (status, attempts, None)
+    if status == 'queued':
+        # Cancelled so the next test's worker doesn't pick it up
+        client.post(f'/jobs/{job_id}/cancel')
+
+
+def test_a_heartbeating_job_is_left_running(seeded, client, fetch, customer_id):
+    job_id = submit(client, 'printed_page', customer_id=customer_id)
+    now = seeded.utc_now()
+    with seeded.app.app_context():
+        seeded.db.session.execute(
+            update(seeded.Jobs).where(seeded.Jobs.JobID == job_id)
+            .values(Status='running', Attempts=1, LockedBy=WORKER, StartedAt=now - datetime.timedelta(hours=1), HeartbeatAt=now)
+        )
+        seeded.db.session.commit()
+        seeded.requeue_stale_jobs()
+
+    assert fetch(select(seeded.Jobs.Status).where(seeded.Jobs.JobID == job_id))[0][0] == 'running'
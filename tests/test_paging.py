@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import func, select
+
+
+def walk(client, url, **params):
+    """Follow next_cursor from the first page to the last, return every row as a dict."""
+    rows = []
+    while True:
+        response = client.get(url, query_string=params)
+        assert response.status_code == 200, response.get_json()
+        page = response.get_json()
+        rows.extend(dict(zip(page['columns'], row)) for row in page['rows'])
+        if not page['next_cursor']:
+            return rows
+        params['cursor'] = page['next_cursor']
+
+
+def test_pages_cover_every_customer_once(seeded, client, fetch):
+    rows = walk(client, '/api/customers', limit=37)
+    ids = [row['CustomerID'] for row in rows]
+    assert ids == sorted(ids, reverse=True)
+    assert len(ids) == fetch(select(func.count()).select_from(seeded.Customers))[0][0]
+
+
+def test_pages_keep_a_sort_with_ties_in_order(client):
+    # Last names can repeat, CustomerID breaks the ties across page boundaries
+    rows = walk(client, '/api/customers', limit=23, sort='LastName', order='asc')
+    keys = [(row['LastName'], row['CustomerID']) for row in rows]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_pages_keep_a_date_sort(client):
+    rows = walk(client, '/api/customers', limit=41, sort='TDLExpirationDate', order='desc')
+    ids = [row['CustomerID'] for row in rows]
+    assert len(set(ids)) == len(ids) == len(walk(client, '/api/customers', limit=500))
+
+
+@pytest.mark.parametrize('params, error', [
+    ({'cursor': 'not-a-cursor'}, 'Invalid cursor'),
+    ({'sort': 'Email'}, 'Cannot sort by Email'),
+    ({'order': 'sideways'}, 'order must be asc or desc'),
+    ({'limit': 'many'}, 'Invalid limit'),
+    ({'StatusID': 'active'}, 'Invalid value for StatusID'),
+])
+def test_bad_paging_arguments_are_rejected(client, params, error):
+    response = client.get('/api/customers', query_string=params)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+def test_limit_is_kept_within_bounds(seeded, client, fetch):
+    customers = fetch(select(func.count()).select_from(seeded.Customers))[0][0]
+    assert len(client.get('/api/customers?limit=0').get_json()['rows']) == 1
+    assert len(client.get('/api/customers?limit=100000').get_json()['rows']) == min(customers, seeded.MAX_PAGE_SIZE)
+
+
+def test_display_search_falls_back_to_substrings(client):
+    def names(**params):
+        page = client.get('/display/search', query_string=params).get_json()
+        columns = page['columns']
+        return page['search'], {(row[columns.index('FirstName')], row[columns.index('LastName')]) for row in page['rows']}
+
+    _, shown = names()
+    first_name, last_name = sorted(shown)[0]
+
+    # No name starts with the middle of a first name, so the prefixes find nothing
+    search, found = names(name=first_name[2:].lower())
+    assert search == 'contains'
+    assert (first_name, last_name) in found
+
+    search, found = names(name=f'{first_name} {last_name[:5]}')
+    assert search == 'prefix'
+    assert (first_name, last_name) in found
+
+    search, found = names(name=first_name[2:], search='prefix')
+    assert (search, found) == ('prefix', set())